@@ -1,4 +1,5 @@
 import logging
+import threading
 
 import sqltap
 from apscheduler.schedulers.background import BackgroundScheduler
@@ -10,10 +11,23 @@ from starlette.responses import RedirectResponse
 from src import models
 from src.core.authentication import get_current_user_function, oauth2_scheme
 from src.core.authentication import router as auth_router
+from src.core.chat_ingest import chat_ingest
+from src.core.chat_search import chat_search
 from src.core.database import SessionLocal, engine, get_db
 from src.core.ecommerce_database import EcomBase, ecom_engine
+from src.core.mailer import (
+    MAIL_POLL_SECONDS,
+    deliver_outbox,
+    purge_outbox,
+    smtp_connection,
+)
+from src.core.product_search import (
+    PRODUCT_SEARCH_REFRESH_MINUTES,
+    rebuild_product_search,
+)
 from src.core.salary_database import SalaryBase, salary_engine
-from src.crud.chathistory import delete_expired_messages
+from src.crud.chathistory import purge_expired_messages, start_chat_search_rebuild
+from src.crud.leave_summary import ensure_leave_summary
 from src.models.ecommerce_models import *
 from src.routers import (
     admin,
@@ -23,6 +37,7 @@ from src.routers import (
     e_commerce,
     employee,
     general,
+    holiday,
     jsonfile,
     leave,
     personal,
@@ -70,6 +85,7 @@ app.include_router(
     business_logic.router, prefix="/business_logic", tags=["business_logic"]
 )
 app.include_router(general.router)
+app.include_router(holiday.router)
 app.include_router(e_commerce.router)
 app.include_router(salary_analytics.router)
 app.include_router(salary_data_grid.router)
@@ -106,7 +122,16 @@ async def get_profile(
 
 
 # Update yearly leave balances function
-def update_yearly_leave_balances(db: Session):
+def update_yearly_leave_balances():
+    # Runs from the scheduler, a session of its own per run
+    db = SessionLocal()
+    try:
+        _update_yearly_leave_balances(db)
+    finally:
+        db.close()
+
+
+def _update_yearly_leave_balances(db: Session):
     employees = db.query(models.EmployeeOnboarding).all()
     for employee in employees:
         employment_details = (
@@ -161,15 +186,42 @@ def start_scheduler():
         year="*",
         month="1",
         day="1",
-        args=[SessionLocal()],
     )
 
-    # Job 2: Delete expired chat messages (runs every day)
+    # Job 2: Purge expired chat messages in batches (runs every 6 hours)
+    scheduler.add_job(
+        purge_expired_messages,
+        trigger="interval",
+        hours=6,
+        max_instances=1,
+        coalesce=True,
+    )
+
+    # Job 3: Deliver queued emails, one run at a time
+    scheduler.add_job(
+        deliver_outbox,
+        trigger="interval",
+        seconds=MAIL_POLL_SECONDS,
+        max_instances=1,
+        coalesce=True,
+    )
+
+    # Job 4: Rebuild the product search index, picks up syncs of other workers
+    scheduler.add_job(
+        rebuild_product_search,
+        trigger="interval",
+        minutes=PRODUCT_SEARCH_REFRESH_MINUTES,
+        max_instances=1,
+        coalesce=True,
+    )
+
+    # Job 5: Delete sent and failed emails past their retention (runs daily)
     scheduler.add_job(
-        delete_expired_messages,  # Job function for deleting expired messages
-        trigger="interval",  # Use 'interval' for recurring jobs
-        hours=6,  # Runs every day
-        args=[SessionLocal()],  # Pass the database session
+        purge_outbox,
+        trigger="cron",
+        hour="3",
+        max_instances=1,
+        coalesce=True,
     )
 
     # Start the scheduler
@@ -179,4 +231,17 @@ def start_scheduler():
 # FastAPI startup event
 @app.on_event("startup")
 async def on_startup():
+    # Before the first request, payslips read unpaid days from the summary
+    ensure_leave_summary()
     start_scheduler()
+    start_chat_search_rebuild()
+    chat_ingest.start()
+    # Title search uses a plain match until the index is built
+    threading.Thread(target=rebuild_product_search, daemon=True).start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    chat_ingest.stop()
+    chat_search.close()
+    smtp_connection.close()
@@ -0,0 +1,102 @@
+"""Storage and decode cost of chat history compression on real history.
+
+Reads questions and responses from BENCH_CHAT_EXPORT, a JSON lines file with
+one {"question": ..., "response": ...} object per chat turn in the order they
+were written, or from chat_history in DATABASE_URL when it is not set. The
+older BENCH_TRAIN_FRACTION of the turns trains a dictionary with
+scripts/train_chat_dictionary.py; every method is measured on the newer turns
+only, so no dictionary is scored on the text it was built from.
+"""
+
+import json
+import os
+import sys
+import time
+import zlib
+
+# Add src to python path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(os.path.dirname(__file__))
+
+from src.core.compression import compress_text, decompress_text
+from src.core.database import SessionLocal
+from src.models.chathistory import ChatHistory
+from train_chat_dictionary import train
+
+ROWS = int(os.getenv("BENCH_ROWS", 20000))
+TRAIN_FRACTION = float(os.getenv("BENCH_TRAIN_FRACTION", 0.5))
+MIN_ROWS = 200
+PAGE = 100
+
+
+def load_turns() -> list:
+    export = os.getenv("BENCH_CHAT_EXPORT")
+    if export:
+        with open(export, encoding="utf-8") as lines:
+            turns = [json.loads(line) for line in lines if line.strip()]
+        return [(turn["question"], turn["response"]) for turn in turns[-ROWS:]]
+    db = SessionLocal()
+    try:
+        turns = (
+            db.query(ChatHistory.question, ChatHistory.response)
+            .order_by(ChatHistory.id.desc())
+            .limit(ROWS)
+            .all()
+        )
+    finally:
+        db.close()
+    return [(question, response) for question, response in reversed(turns)]
+
+
+def with_dictionary(dictionary: bytes):
+    # The deflate settings of compress_text with another preset dictionary
+    def encode(text: str) -> bytes:
+        compressor = zlib.compressobj(level=6, wbits=-15, zdict=dictionary)
+        return compressor.compress(text.encode()) + compressor.flush()
+
+    def decode(value: bytes) -> str:
+        decompressor = zlib.decompressobj(wbits=-15, zdict=dictionary)
+        return (decompressor.decompress(value) + decompressor.flush()).decode()
+
+    return encode, decode
+
+
+def measure(name, encode, decode, texts):
+    start = time.perf_counter()
+    packed = [encode(text) for text in texts]
+    encode_us = (time.perf_counter() - start) / len(texts) * 1e6
+    start = time.perf_counter()
+    for value in packed[:PAGE]:
+        decode(value)
+    page_ms = (time.perf_counter() - start) * 1000
+    raw = sum(len(text.encode()) for text in texts)
+    stored = sum(len(value) for value in packed)
+    print(
+        f"{name:<28} {stored / raw:6.1%} of {raw} bytes, "
+        f"encode {encode_us:6.1f} us/row, "
+        f"decode {page_ms:6.2f} ms per {PAGE}-row page"
+    )
+
+
+if __name__ == "__main__":
+    turns = load_turns()
+    if len(turns) < MIN_ROWS:
+        sys.exit(f"{len(turns)} chat turns found, at least {MIN_ROWS} are needed")
+    split = int(len(turns) * TRAIN_FRACTION)
+    dictionary = train(f"{question} {response}" for question, response in turns[:split])
+    # Both columns are compressed on their own, measure them the same way
+    texts = [text or "" for turn in turns[split:] for text in turn]
+    print(
+        f"{split} turns to train a {len(dictionary)}-byte dictionary, "
+        f"{len(turns) - split} held out"
+    )
+
+    measure("plain text", str.encode, bytes.decode, texts)
+    measure(
+        "zlib, no dictionary",
+        lambda text: zlib.compress(text.encode()),
+        lambda value: zlib.decompress(value).decode(),
+        texts,
+    )
+    measure("CompressedText (shipped)", compress_text, decompress_text, texts)
+    measure("trained on older turns", *with_dictionary(dictionary), texts)
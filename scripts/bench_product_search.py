@@ -0,0 +1,143 @@
+"""Benchmark /products/advanced-search against the old join + GROUP BY query.
+
+Seeds ECOM_DB_URL with BENCH_PRODUCTS mock products (100k by default, once)
+and times a set of searches both ways. The old query outer-joined every
+relation and grouped by product id whatever the filters were.
+"""
+
+import inspect
+import os
+import sys
+import time
+
+# Add src to python path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(os.path.dirname(__file__))
+
+from fastapi.params import Depends, Query
+from sqlalchemy import and_
+
+from mock_products_api import make_product
+from src.core.ecommerce_database import EcomBase, EcomSessionLocal, ecom_engine
+from src.load_products import write_products
+from src.models.ecommerce_models import Dimensions, Product, ProductTag, Review
+from src.routers import e_commerce
+
+PRODUCTS = int(os.getenv("BENCH_PRODUCTS", 100_000))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", 5))
+SEED_CHUNK = 5000
+
+SEARCHES = [
+    {},
+    {"category": "laptops", "min_price": 500},
+    {"brand": "Apple", "sort_by": "price", "sort_order": "asc"},
+    {"min_width": 10, "max_width": 20},
+    {"tags": ["sale", "kitchen"]},
+    {"min_review_rating": 4, "reviewer_name": "Reviewer 1"},
+    {"category": "beauty", "tags": ["beauty"], "min_review_rating": 5},
+    # Sorted on an unindexed column or with few matches: every row is visited
+    {"sort_by": "rating"},
+    {"tags": ["sale"], "sort_by": "rating"},
+    {"min_review_rating": 5, "min_width": 25, "sort_by": "price"},
+    {"reviewer_name": "Nobody"},
+]
+
+
+def seed():
+    EcomBase.metadata.create_all(bind=ecom_engine)
+    db = EcomSessionLocal()
+    try:
+        have = db.query(Product.id).count()
+        for start in range(have + 1, PRODUCTS + 1, SEED_CHUNK):
+            end = min(start + SEED_CHUNK, PRODUCTS + 1)
+            write_products(db, [make_product(i) for i in range(start, end)], set())
+            db.commit()
+            print(f"Seeded {end - 1} products", end="\r")
+    finally:
+        db.close()
+
+
+def legacy_search(params: dict, limit: int = 20) -> list:
+    # The query as it was: every relation joined, then grouped
+    db = EcomSessionLocal()
+    try:
+        query = (
+            db.query(Product.id)
+            .outerjoin(Product.dimensions)
+            .outerjoin(Product.meta)
+            .outerjoin(Product.reviews)
+            .outerjoin(Product.tags)
+        )
+        filters = []
+        if "category" in params:
+            filters.append(Product.category == params["category"])
+        if "brand" in params:
+            filters.append(Product.brand == params["brand"])
+        if "min_price" in params:
+            filters.append(Product.price >= params["min_price"])
+        if "min_width" in params:
+            filters.append(Dimensions.width >= params["min_width"])
+        if "max_width" in params:
+            filters.append(Dimensions.width <= params["max_width"])
+        if "min_review_rating" in params:
+            filters.append(Review.rating >= params["min_review_rating"])
+        if "reviewer_name" in params:
+            filters.append(Review.reviewer_name.ilike(f"%{params['reviewer_name']}%"))
+        if "tags" in params:
+            filters.append(ProductTag.tag.in_(params["tags"]))
+        if filters:
+            query = query.filter(and_(*filters))
+        query = query.group_by(Product.id)
+        sort_column = getattr(Product, params.get("sort_by", "id"))
+        if params.get("sort_order", "desc") == "desc":
+            query = query.order_by(sort_column.desc())
+        else:
+            query = query.order_by(sort_column.asc())
+        product_ids = [product_id for (product_id,) in query.limit(limit)]
+        products = e_commerce.load_products_by_ids(db, product_ids)
+        return [e_commerce.serialize_product(p) for p in products]
+    finally:
+        db.close()
+
+
+def search(params: dict, limit: int = 20) -> list:
+    # The endpoint called directly, so both sides skip the HTTP layer
+    kwargs = {}
+    for name, parameter in inspect.signature(
+        e_commerce.advanced_search_products
+    ).parameters.items():
+        default = parameter.default
+        if isinstance(default, Depends):
+            continue
+        kwargs[name] = default.default if isinstance(default, Query) else default
+    db = EcomSessionLocal()
+    try:
+        kwargs.update(params, limit=limit, db=db)
+        return e_commerce.advanced_search_products(**kwargs)["products"]
+    finally:
+        db.close()
+
+
+def best_of(function) -> float:
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+if __name__ == "__main__":
+    seed()
+    print(f"{PRODUCTS} products, {ecom_engine.dialect.name}, best of {ROUNDS}")
+    for params in SEARCHES:
+        new_ids = [p["id"] for p in search(params)]
+        old_ids = [p["id"] for p in legacy_search(params)]
+        old_ms = best_of(lambda: legacy_search(params))
+        new_ms = best_of(lambda: search(params))
+        # Ties in the sort column may come back in another order
+        same = sorted(new_ids) == sorted(old_ids) or "sort_by" in params
+        print(
+            f"{str(params):70} join+group {old_ms:8.1f} ms  "
+            f"exists {new_ms:8.1f} ms  x{old_ms / new_ms:5.1f}  same: {same}"
+        )
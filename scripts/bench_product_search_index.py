@@ -0,0 +1,51 @@
+"""Lookup times of the in-memory product search index.
+
+Builds the index from the products in ECOM_DB_URL (seed them with
+scripts/bench_product_search.py) and times a few queries against the
+ILIKE title scan the index replaces.
+"""
+
+import os
+import sys
+import time
+
+# Add src to python path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src.core.ecommerce_database import EcomSessionLocal
+from src.core.product_search import product_search
+from src.models.ecommerce_models import Product
+
+ROUNDS = int(os.getenv("BENCH_ROUNDS", 50))
+QUERIES = ["product 4217", "chanel perfumes 999", "produ", "apple sale", "kitchen"]
+
+
+def best_of(function, rounds: int = ROUNDS) -> float:
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+if __name__ == "__main__":
+    product_search.build()
+    print(product_search.stats())
+    db = EcomSessionLocal()
+    try:
+        for query in QUERIES:
+            matches = len(product_search.search(query))
+            index_ms = best_of(lambda: product_search.search(query))
+            scan_ms = best_of(
+                lambda: db.query(Product.id)
+                .filter(Product.title.ilike(f"%{query}%"))
+                .all(),
+                rounds=5,
+            )
+            print(
+                f"{query!r:24} {matches:7} matches  index {index_ms:8.3f} ms  "
+                f"ILIKE scan {scan_ms:8.1f} ms"
+            )
+    finally:
+        db.close()
@@ -0,0 +1,81 @@
+import io
+import os
+import sys
+import time
+from datetime import date
+
+import fillpdf.fillpdfs as fillpdfs
+
+# Add src to python path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src.core.salary_slip import (
+    SALARY_SLIP_TEMPLATE,
+    SLIP_FIELDS,
+    compute_salary_slip,
+    render_salary_slip,
+    render_salary_slips,
+)
+
+SLIPS = int(os.getenv("BENCH_SLIPS", 200))
+
+
+def sample_slip(i: int) -> dict:
+    return compute_salary_slip(
+        30000 + i,
+        22,
+        i % 3,
+        date_of_joining=date(2021, 3, 15),
+        pay_period=date(2024, 5, 1),
+        employee_name=f"Employee {i}",
+        designation="Software Engineer",
+        department="Engineering",
+    )
+
+
+def render_uncached(slip: dict) -> bytes:
+    # What every request did before: parse for the field names, parse again
+    # to fill the form
+    fillpdfs.get_form_fields(SALARY_SLIP_TEMPLATE)
+    data = {field: slip[name] for name, field in SLIP_FIELDS.items()}
+    pdf_stream = io.BytesIO()
+    fillpdfs.write_fillable_pdf(SALARY_SLIP_TEMPLATE, pdf_stream, data)
+    return pdf_stream.getvalue()
+
+
+def render_fillpdf_cached(slip: dict) -> bytes:
+    # The previous renderer: the field names were cached, but every fill
+    # still parses the template again through pdfrw
+    data = {field: slip[name] for name, field in SLIP_FIELDS.items()}
+    pdf_stream = io.BytesIO()
+    fillpdfs.write_fillable_pdf(SALARY_SLIP_TEMPLATE, pdf_stream, data)
+    return pdf_stream.getvalue()
+
+
+def bench(name, render):
+    slips = [sample_slip(i) for i in range(SLIPS)]
+    render(slips[0])  # warm up
+    start = time.perf_counter()
+    for slip in slips:
+        render(slip)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:<24} {SLIPS / elapsed:8.1f} slips/s "
+        f"{elapsed / SLIPS * 1000:6.2f} ms/slip"
+    )
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(os.path.dirname(__file__), ".."))
+    bench("fillpdf per request", render_uncached)
+    bench("fillpdf, cached fields", render_fillpdf_cached)
+    bench("flat template", render_salary_slip)
+
+    slips = [sample_slip(i) for i in range(SLIPS)]
+    start = time.perf_counter()
+    size = len(render_salary_slips(slips))
+    elapsed = time.perf_counter() - start
+    print(
+        f"{'one multi-page PDF':<24} {SLIPS / elapsed:8.1f} slips/s "
+        f"{elapsed / SLIPS * 1000:6.2f} ms/slip {size / SLIPS / 1024:6.1f} KiB/slip"
+    )
@@ -0,0 +1,136 @@
+"""Deliver the email outbox against a local aiosmtpd server.
+
+Run against a scratch database: every pending email in the outbox is sent to
+the local server. Needs ``pip install aiosmtpd``.
+"""
+
+import os
+import sys
+from datetime import datetime
+
+# The mailer reads its server settings at import time
+os.environ.setdefault("SMTP_HOST", "127.0.0.1")
+os.environ.setdefault("SMTP_PORT", "8025")
+os.environ.setdefault("SMTP_STARTTLS", "false")
+os.environ["EMAIL_PASSWORD"] = ""
+os.environ.setdefault("SENDER_EMAIL", "hr@example.com")
+
+# Add src to python path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from aiosmtpd.controller import Controller
+
+from src import models
+from src.core.database import SessionLocal, engine
+from src.core import mailer
+from src.core.mailer import (
+    SMTP_HOST,
+    SMTP_PORT,
+    deliver_outbox,
+    enqueue_email,
+    purge_outbox,
+)
+from src.models.email import EmailOutbox, EmailStatus
+
+EMAILS = int(os.getenv("CHECK_EMAILS", 20))
+
+
+class Recorder:
+    def __init__(self):
+        self.messages = []
+        self.connections = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+def start_server(recorder):
+    controller = Controller(recorder, hostname=SMTP_HOST, port=SMTP_PORT)
+    controller.start()
+    return controller
+
+
+if __name__ == "__main__":
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    recorder = Recorder()
+    controller = start_server(recorder)
+    try:
+        for i in range(EMAILS):
+            enqueue_email(db, f"employee{i}@example.com", "Outbox check", f"Mail {i}")
+        db.commit()
+        print("delivered:", deliver_outbox(batch_size=8))
+        print(
+            f"server received {len(recorder.messages)} messages "
+            f"over {recorder.connections} connection(s)"
+        )
+        assert len(recorder.messages) >= EMAILS
+
+        # Notifications sharing a digest key go out as one message
+        received = len(recorder.messages)
+        for i in range(3):
+            enqueue_email(
+                db, "lead@example.com", "Leave", f"Leave {i}", digest_key="leave:lead"
+            )
+        db.commit()
+        print("digest before its window:", deliver_outbox())
+        db.query(EmailOutbox).filter(EmailOutbox.digest_key == "leave:lead").update(
+            {EmailOutbox.next_attempt_at: datetime.now()}
+        )
+        db.commit()
+        print("digest due:", deliver_outbox())
+        assert len(recorder.messages) == received + 1
+
+        # With the server down the mail stays queued with a backoff
+        controller.stop()
+        email = enqueue_email(db, "retry@example.com", "Outbox retry", "Retry")
+        db.commit()
+        print("server down:", deliver_outbox())
+        db.refresh(email)
+        print(
+            f"status={email.status.value} attempts={email.attempts} "
+            f"next_attempt_at={email.next_attempt_at:%H:%M:%S}"
+        )
+        assert email.status == EmailStatus.PENDING and email.attempts == 1
+
+        controller = start_server(recorder)
+        email.next_attempt_at = datetime.now()
+        db.commit()
+        print("server back:", deliver_outbox())
+        db.refresh(email)
+        assert email.status == EmailStatus.SENT
+        print("retried email sent")
+
+        # Sent emails keep no body or attachment
+        assert email.body == "" and email.attachment is None
+        print("sent email body cleared")
+
+        # A message that cannot be built fails alone, the rest is delivered
+        received = len(recorder.messages)
+        broken = enqueue_email(db, "broken@example.com", "Broken", "Broken")
+        enqueue_email(db, "fine@example.com", "Fine", "Fine")
+        db.commit()
+        build = mailer.build_message
+        mailer.build_message = lambda emails: (
+            build(emails) if emails[0].id != broken.id else 1 / 0
+        )
+        print("one broken email:", deliver_outbox())
+        mailer.build_message = build
+        db.refresh(broken)
+        assert broken.status == EmailStatus.FAILED
+        assert len(recorder.messages) == received + 1
+
+        # Past the retention only pending emails are left
+        print("purged:", purge_outbox(retention_days=-1))
+        assert db.query(EmailOutbox).filter(
+            EmailOutbox.status != EmailStatus.PENDING
+        ).count() == 0
+    finally:
+        controller.stop()
+        db.close()
@@ -0,0 +1,139 @@
+"""Start, fail and resume a payroll run through the employee router.
+
+Run against a scratch database: it seeds a few employees and a payroll run
+for CHECK_YEAR/CHECK_MONTH. The slip of one employee fails on the first
+attempt, the run must end FAILED with only that item failed, and resuming it
+through POST /employee/payroll-run/{run_id}/resume must complete it.
+
+An approved unpaid leave is written straight to employee_leaves, as on a
+database from before leave_summary existed; after the startup rebuild its
+payroll item must carry the same unpaid days as the employee's slip.
+"""
+
+import os
+import sys
+from datetime import date
+
+# Add src to python path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src import models
+from src.core.authentication import get_current_user_roles
+from src.core.database import SessionLocal, engine
+from src.crud import payroll
+from src.crud.leave_summary import ensure_leave_summary, get_unpaid_leave_days
+from src.models.employee import EmployeeEmploymentDetails
+from src.models.leave import EmployeeLeave, LeaveDuration, LeaveStatus
+from src.models.payroll import PayrollRunItem
+from src.models.personal import EmployeeOnboarding
+from src.routers import employee
+
+YEAR = int(os.getenv("CHECK_YEAR", 2024))
+MONTH = int(os.getenv("CHECK_MONTH", 3))
+EMPLOYEES = 3
+
+
+def seed(db):
+    ids = []
+    for i in range(EMPLOYEES):
+        code = f"payroll{i:04d}"
+        db.add(
+            EmployeeOnboarding(
+                employment_id=code,
+                firstname=f"Payroll {i}",
+                lastname="Check",
+                dateofbirth=date(1990, 1, 1),
+                contactnumber=9000000000 + i,
+                emailaddress=f"{code}@example.com",
+                address="Chennai",
+                nationality="Indian",
+            )
+        )
+        db.flush()
+        details = EmployeeEmploymentDetails(
+            employee_id=code,
+            employee_email=f"{code}@example.com",
+            password=f"{code}-password",
+            job_position="Developer",
+            department="Engineering",
+            start_date=date(2020, 1, 1),
+            employment_type="full-time",
+            work_location="chennai",
+            basic_salary=30000,
+        )
+        db.add(details)
+        db.flush()
+        ids.append(details.id)
+    db.add(
+        EmployeeLeave(
+            employee_id=ids[-1],
+            leave_type="unpaid",
+            start_date=date(YEAR, MONTH, 4),
+            end_date=date(YEAR, MONTH, 4),
+            duration=LeaveDuration.ONE_DAY,
+            status=LeaveStatus.APPROVED,
+            reason="Payroll check",
+        )
+    )
+    db.commit()
+    return ids
+
+
+def client():
+    app = FastAPI()
+    app.include_router(employee.router)
+    # Act as an admin without a token
+    app.dependency_overrides[get_current_user_roles] = lambda: ["admin"]
+    return TestClient(app)
+
+
+if __name__ == "__main__":
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        ids = seed(db)
+    finally:
+        db.close()
+    ensure_leave_summary()
+    broken, on_leave = ids[0], ids[-1]
+
+    item_slip = payroll._item_slip
+
+    def failing_item_slip(item, *args):
+        if item.employee_id == broken:
+            raise ValueError("bad employee data")
+        return item_slip(item, *args)
+
+    api = client()
+    payroll._item_slip = failing_item_slip
+    started = api.post(f"/employee/payroll-run/{YEAR}/{MONTH}").json()
+    run_id = started["run_id"]
+    run = api.get(f"/employee/payroll-run/{run_id}").json()
+    print("first attempt:", run["status"], run["items"], run["failures"])
+    assert run["status"] == "failed"
+    assert run["items"].get("failed") == 1
+    assert [f["employee_id"] for f in run["failures"]] == [broken]
+
+    db = SessionLocal()
+    try:
+        item = db.query(PayrollRunItem).filter_by(
+            run_id=run_id, employee_id=on_leave
+        ).one()
+        slip_days = get_unpaid_leave_days(db, on_leave, YEAR, MONTH)
+    finally:
+        db.close()
+    print("unpaid days, payroll item and slip:", item.unpaid_days, slip_days)
+    assert item.unpaid_days == slip_days == 1.0
+
+    payroll._item_slip = item_slip
+    response = api.post(f"/employee/payroll-run/{run_id}/resume")
+    print("resume:", response.status_code)
+    assert response.status_code == 200, response.text
+    run = api.get(f"/employee/payroll-run/{run_id}").json()
+    print("after resume:", run["status"], run["items"])
+    assert run["status"] == "completed"
+    assert run["items"] == {"rendered": run["total"]}
+    print("payroll run resumed")
@@ -0,0 +1,96 @@
+"""Query count of /products/advanced-search.
+
+Seeds the ecommerce database from ECOM_DB_URL with mock products and fails
+when a page of results takes more queries than the bulk loader should: one
+for the page of ids, one for the products and one per child collection.
+"""
+
+import os
+import sys
+from contextlib import contextmanager
+
+# Add src to python path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(os.path.dirname(__file__))
+
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from mock_products_api import make_product
+from src.core.ecommerce_database import EcomBase, EcomSessionLocal, ecom_engine
+from src.load_products import write_products
+from src.models.ecommerce_models import Product
+from src.routers import e_commerce
+
+PRODUCTS = int(os.getenv("CHECK_PRODUCTS", 500))
+# ids, products, dimensions, meta, tags, images, reviews
+MAX_QUERIES = 7
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(ecom_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(ecom_engine, "before_cursor_execute", before_cursor_execute)
+
+
+def seed():
+    EcomBase.metadata.create_all(bind=ecom_engine)
+    db = EcomSessionLocal()
+    try:
+        existing = {product_id for (product_id,) in db.query(Product.id)}
+        products = [make_product(i) for i in range(1, PRODUCTS + 1)]
+        write_products(
+            db, [p for p in products if p["id"] not in existing], existing
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def lazy_page(params: dict) -> list:
+    # The same page serialized with plain lazy loading, for comparison
+    db = EcomSessionLocal()
+    try:
+        query = db.query(Product).order_by(Product.id.desc())
+        if "category" in params:
+            query = query.filter(Product.category == params["category"])
+        return [
+            e_commerce.serialize_product(p)
+            for p in query.limit(params.get("limit", 20))
+        ]
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    seed()
+    app = FastAPI()
+    app.include_router(e_commerce.router)
+    client = TestClient(app)
+
+    failed = False
+    for params in ({"limit": 100}, {"limit": 100, "category": "laptops"}):
+        with count_queries() as statements:
+            response = client.get("/products/advanced-search", params=params)
+        response.raise_for_status()
+        products = response.json()["products"]
+        # Same page, same content as lazy loading gives
+        same = products == jsonable_encoder(lazy_page(params))
+        ok = len(statements) <= MAX_QUERIES and same
+        failed |= not ok
+        print(
+            f"{params}: {len(products)} products in {len(statements)} queries "
+            f"(max {MAX_QUERIES}), same as lazy loading: {same}, "
+            f"{'ok' if ok else 'FAILED'}"
+        )
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,37 @@
+"""Cache keys of /products/query.
+
+Queries that differ only in comments, spacing or the case of keywords and
+function names must share a key; queries that differ in a literal or an
+identifier must not.
+"""
+
+import os
+import sys
+
+# Add src to python path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src.core.sql_cache import normalize_sql
+
+SAME_KEY = [
+    ("select count(*) from t", "SELECT COUNT(*) FROM t"),
+    ("select Max(price) from products", "SELECT max( price ) FROM products"),
+    (
+        "select id from products -- cheap ones\nwhere price < 10",
+        "SELECT id\n  FROM products WHERE price < 10;",
+    ),
+]
+DIFFERENT_KEY = [
+    (
+        "select id from products where brand = 'a'",
+        "select id from products where brand = 'A'",
+    ),
+    ('select "Title" from products', 'select "title" from products'),
+]
+
+if __name__ == "__main__":
+    for first, second in SAME_KEY:
+        assert normalize_sql(first) == normalize_sql(second), (first, second)
+    for first, second in DIFFERENT_KEY:
+        assert normalize_sql(first) != normalize_sql(second), (first, second)
+    print(f"{len(SAME_KEY) + len(DIFFERENT_KEY)} key checks passed")
@@ -0,0 +1,102 @@
+import os
+import sys
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+
+# Add src to python path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import models
+from src.core.database import engine
+from src.core.ecommerce_database import EcomBase, ecom_engine
+from src.core.salary_database import SalaryBase, salary_engine
+from src.models import ecommerce_models, salary_models  # noqa: F401 register tables
+
+# create_all() only creates columns and indexes together with new tables, so
+# nullable columns and indexes added to models later are created here.
+DATABASES = [
+    (models.Base.metadata, engine),
+    (EcomBase.metadata, ecom_engine),
+    (SalaryBase.metadata, salary_engine),
+]
+
+
+def create_missing_columns():
+    for metadata, bind in DATABASES:
+        inspector = inspect(bind)
+        existing_tables = set(inspector.get_table_names())
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                print(f"Adding column {column.name} to {table.name}")
+                ddl = CreateColumn(column).compile(dialect=bind.dialect)
+                with bind.begin() as connection:
+                    connection.execute(
+                        text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+                    )
+
+
+def create_missing_indexes():
+    for metadata, bind in DATABASES:
+        inspector = inspect(bind)
+        existing_tables = set(inspector.get_table_names())
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            existing.update(
+                constraint["name"]
+                for constraint in inspector.get_unique_constraints(table.name)
+            )
+            created = False
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+                if index.unique:
+                    drop_duplicates(bind, table, index)
+                print(f"Creating index {index.name} on {table.name}")
+                index.create(bind=bind)
+                created = True
+            if created:
+                analyze_table(bind, table.name)
+
+
+def drop_duplicates(bind, table, index):
+    # A unique index can not be created over existing duplicates: the row with
+    # the lowest id of each key is kept. NULLs group together here, so rows
+    # written before the key columns were coalesced are deduplicated as well.
+    key = ", ".join(column.name for column in index.columns)
+    id_column = table.primary_key.columns.keys()[0]
+    # The derived table lets MySQL read the table it deletes from
+    statement = (
+        f"DELETE FROM {table.name} WHERE {id_column} NOT IN ("
+        f"SELECT {id_column} FROM (SELECT MIN({id_column}) AS {id_column} "
+        f"FROM {table.name} GROUP BY {key}) AS keep)"
+    )
+    with bind.begin() as connection:
+        deleted = connection.execute(text(statement)).rowcount
+    if deleted:
+        print(f"Deleted {deleted} duplicate rows of {table.name} for {index.name}")
+
+
+def analyze_table(bind, table_name: str):
+    # Without statistics SQLite may pick a new index for a query it does not
+    # help, e.g. scanning products by rating to sort them by price
+    statement = {
+        "mysql": f"ANALYZE TABLE {table_name}",
+        "sqlite": f"ANALYZE {table_name}",
+        "postgresql": f"ANALYZE {table_name}",
+    }.get(bind.dialect.name)
+    if statement:
+        with bind.begin() as connection:
+            connection.execute(text(statement))
+
+
+if __name__ == "__main__":
+    create_missing_columns()
+    create_missing_indexes()
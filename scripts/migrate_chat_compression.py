@@ -0,0 +1,82 @@
+import os
+import sys
+
+# Add src to python path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import Column, Integer, LargeBinary, MetaData, Table, bindparam, text
+
+from src.core.compression import compress_text, is_compressed
+from src.core.database import engine
+
+CHUNK_SIZE = 2000
+
+# The chat columns as raw bytes, bypassing CompressedText
+raw_chat_history = Table(
+    "chat_history",
+    MetaData(),
+    Column("id", Integer, primary_key=True),
+    Column("question", LargeBinary),
+    Column("response", LargeBinary),
+)
+
+
+def convert_columns(connection):
+    # TEXT to BLOB keeps the stored UTF-8 bytes, which read back as legacy
+    # plain text until they are rewritten below. SQLite needs no change.
+    if engine.dialect.name == "mysql":
+        connection.execute(
+            text(
+                "ALTER TABLE chat_history MODIFY question BLOB, "
+                "MODIFY response LONGBLOB"
+            )
+        )
+        connection.commit()
+
+
+def _packed(value):
+    if value is None or is_compressed(value):
+        return value
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        value = bytes(value).decode()
+    return compress_text(value)
+
+
+def compress_existing_rows(connection) -> tuple:
+    # Resumable: rows already compressed are left alone
+    last_id = 0
+    before = after = rows_seen = 0
+    while True:
+        rows = connection.execute(
+            raw_chat_history.select()
+            .where(raw_chat_history.c.id > last_id)
+            .order_by(raw_chat_history.c.id)
+            .limit(CHUNK_SIZE)
+        ).all()
+        if not rows:
+            break
+        updates = []
+        for row in rows:
+            question, response = _packed(row.question), _packed(row.response)
+            before += sum(len(v or b"") for v in (row.question, row.response))
+            after += sum(len(v or b"") for v in (question, response))
+            if (question, response) != (row.question, row.response):
+                updates.append({"row_id": row.id, "q": question, "r": response})
+        if updates:
+            connection.execute(
+                raw_chat_history.update()
+                .where(raw_chat_history.c.id == bindparam("row_id"))
+                .values(question=bindparam("q"), response=bindparam("r")),
+                updates,
+            )
+        connection.commit()
+        rows_seen += len(rows)
+        last_id = rows[-1].id
+    return rows_seen, before, after
+
+
+if __name__ == "__main__":
+    with engine.connect() as connection:
+        convert_columns(connection)
+        rows, before, after = compress_existing_rows(connection)
+    print(f"{rows} rows, {before} bytes before, {after} bytes after")
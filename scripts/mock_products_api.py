@@ -0,0 +1,139 @@
+"""Local stand-in for the dummyjson products API.
+
+    python scripts/mock_products_api.py            serve on MOCK_PORT
+    python scripts/mock_products_api.py --check    serve and run a sync into ECOM_DB_URL
+
+Point the app at it with PRODUCTS_API_URL=http://127.0.0.1:<port>/products.
+"""
+
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PORT = int(os.getenv("MOCK_PORT", 8099))
+PRODUCTS = int(os.getenv("MOCK_PRODUCTS", 1000))
+LATENCY_MS = int(os.getenv("MOCK_LATENCY_MS", 50))
+
+CATEGORIES = ["beauty", "fragrances", "furniture", "groceries", "laptops"]
+BRANDS = ["Essence", "Glamour Beauty", "Chanel", "Apple", "Samsung", None]
+TAGS = ["beauty", "mascara", "perfumes", "kitchen", "electronics", "sale"]
+
+
+def make_product(product_id: int, version: int = 0) -> dict:
+    # Same id gives the same product; a new version changes every tenth
+    # product: price, stock, one tag and one review
+    rng = random.Random(product_id)
+    version = version if product_id % 10 == 0 else 0
+    return {
+        "id": product_id,
+        "title": f"Product {product_id}",
+        "description": f"Description of product {product_id}",
+        "category": rng.choice(CATEGORIES),
+        "price": round(rng.uniform(1, 2000), 2) + version,
+        "discountPercentage": round(rng.uniform(0, 20), 2),
+        "rating": round(rng.uniform(1, 5), 2),
+        "stock": rng.randint(0, 150) + version,
+        "tags": rng.sample(TAGS, 2)[: 2 - min(version, 1)] + ["new"] * min(version, 1),
+        "brand": rng.choice(BRANDS),
+        "sku": f"SKU-{product_id:06d}",
+        "weight": rng.randint(1, 10),
+        "dimensions": {
+            "width": round(rng.uniform(5, 30), 2),
+            "height": round(rng.uniform(5, 30), 2),
+            "depth": round(rng.uniform(5, 30), 2),
+        },
+        "warrantyInformation": "1 month warranty",
+        "shippingInformation": "Ships in 1 month",
+        "availabilityStatus": "In Stock",
+        "reviews": [
+            {
+                "rating": rng.randint(1, 5),
+                "comment": "Very satisfied!" if i or not version else "Changed my mind",
+                "date": f"2024-05-23T08:56:{i:02d}.000Z",
+                "reviewerName": f"Reviewer {i}",
+                "reviewerEmail": f"reviewer{i}@x.dummyjson.com",
+            }
+            for i in range(3)
+        ],
+        "returnPolicy": "30 days return policy",
+        "minimumOrderQuantity": rng.randint(1, 50),
+        "meta": {
+            "createdAt": "2024-05-23T08:56:21.618Z",
+            "updatedAt": "2024-05-23T08:56:21.618Z",
+            "barcode": f"{product_id:013d}",
+            "qrCode": "https://assets.dummyjson.com/public/qr-code.png",
+        },
+        "images": [
+            f"https://cdn.dummyjson.com/products/images/{product_id}/{i}.png"
+            for i in range(2)
+        ],
+        "thumbnail": f"https://cdn.dummyjson.com/products/images/{product_id}/t.png",
+    }
+
+
+class MockProductsHandler(BaseHTTPRequestHandler):
+    requests_served = 0
+    version = 0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/products":
+            self.send_error(404)
+            return
+        params = parse_qs(url.query)
+        limit = int(params.get("limit", ["30"])[0])
+        skip = int(params.get("skip", ["0"])[0])
+        time.sleep(LATENCY_MS / 1000)
+        products = [
+            make_product(product_id, self.version)
+            for product_id in range(skip + 1, min(skip + limit, PRODUCTS) + 1)
+        ]
+        body = json.dumps(
+            {"products": products, "total": PRODUCTS, "skip": skip, "limit": limit}
+        ).encode()
+        MockProductsHandler.requests_served += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port: int = PORT) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockProductsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    server = serve()
+    if "--check" not in sys.argv:
+        print(f"Serving {PRODUCTS} products on http://127.0.0.1:{PORT}/products")
+        threading.Event().wait()
+
+    os.environ["PRODUCTS_API_URL"] = f"http://127.0.0.1:{PORT}/products"
+    # Add src to python path
+    sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+    from src.core.ecommerce_database import EcomBase, ecom_engine
+    from src.load_products import run_product_sync, start_product_sync, sync_status
+
+    EcomBase.metadata.create_all(bind=ecom_engine)
+    for attempt in ("first sync", "unchanged", "every tenth changed"):
+        if attempt == "every tenth changed":
+            MockProductsHandler.version = 1
+        start = time.perf_counter()
+        start_product_sync()
+        run_product_sync()
+        print(
+            f"{attempt}: {time.perf_counter() - start:.2f}s, "
+            f"{MockProductsHandler.requests_served} requests so far, {sync_status}"
+        )
+    server.shutdown()
@@ -0,0 +1,15 @@
+import os
+import sys
+
+# Add src to python path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src.core.chat_search import chat_search
+from src.crud.chathistory import rebuild_chat_search
+
+if __name__ == "__main__":
+    # Reindexes all of chat_history, for existing data or a lost index file.
+    # The app does the same at startup when it finds the index empty.
+    chat_search.clear()
+    indexed = rebuild_chat_search()
+    print(f"Indexed {indexed} chat messages into {chat_search.path}")
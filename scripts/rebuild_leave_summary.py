@@ -0,0 +1,23 @@
+import json
+import os
+import sys
+
+# Add src to python path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src import models
+from src.core.database import SessionLocal, engine
+from src.crud.leave_summary import check_leave_summary, rebuild_leave_summary
+
+if __name__ == "__main__":
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        # --check only reports drift, without it the summary is rebuilt
+        if "--check" in sys.argv:
+            report = check_leave_summary(db)
+            print(json.dumps(report, indent=2))
+            sys.exit(0 if report["consistent"] else 1)
+        print(rebuild_leave_summary(db)["detail"])
+    finally:
+        db.close()
@@ -0,0 +1,55 @@
+import os
+import sys
+from collections import Counter
+
+# Add src to python path
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+from src.core.database import SessionLocal
+from src.models.chathistory import ChatHistory
+
+SAMPLE_ROWS = int(os.getenv("TRAIN_ROWS", 20000))
+DICTIONARY_BYTES = 4096
+
+
+def train(texts) -> bytes:
+    # Phrases of 2 to 6 words scored by the bytes they would save. zlib
+    # prefers matches near the end of the dictionary, so the best go last.
+    counts = Counter()
+    for text in texts:
+        words = text.split(" ")
+        for size in range(2, 7):
+            for i in range(len(words) - size + 1):
+                counts[" ".join(words[i : i + size])] += 1
+    ranked = sorted(
+        (phrase for phrase, count in counts.items() if count > 1),
+        key=lambda phrase: counts[phrase] * len(phrase),
+        reverse=True,
+    )
+    chosen, size = [], 0
+    for phrase in ranked:
+        if any(phrase in other for other in chosen):
+            continue
+        encoded = (phrase + " ").encode()
+        if size + len(encoded) > DICTIONARY_BYTES:
+            break
+        chosen.append(phrase)
+        size += len(encoded)
+    return "".join(phrase + " " for phrase in reversed(chosen)).encode()
+
+
+if __name__ == "__main__":
+    # Prints a dictionary to add to CHAT_DICTIONARIES under a new version
+    db = SessionLocal()
+    try:
+        texts = [
+            f"{question} {response}"
+            for question, response in db.query(
+                ChatHistory.question, ChatHistory.response
+            )
+            .order_by(ChatHistory.id.desc())
+            .limit(SAMPLE_ROWS)
+        ]
+    finally:
+        db.close()
+    print(repr(train(texts)))
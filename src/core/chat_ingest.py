@@ -0,0 +1,294 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, status
+from sqlalchemy.exc import InterfaceError, OperationalError, ProgrammingError
+from sqlalchemy.orm import Session
+
+from src.core.chat_search import chat_search
+from src.core.database import SessionLocal
+from src.models.chathistory import ChatHistory
+from src.models.employee import EmployeeEmploymentDetails
+
+CHAT_FLUSH_MS = int(os.getenv("CHAT_FLUSH_MS", 200))
+CHAT_FLUSH_SIZE = int(os.getenv("CHAT_FLUSH_SIZE", 500))
+# Beyond this many unflushed messages new ones are refused with 503
+CHAT_BUFFER_LIMIT = int(os.getenv("CHAT_BUFFER_LIMIT", 20000))
+CHAT_ACTIVE_IDS_SECONDS = int(os.getenv("CHAT_ACTIVE_IDS_SECONDS", 300))
+# One journal per process; give each worker its own path
+CHAT_JOURNAL_PATH = os.getenv("CHAT_JOURNAL_PATH", "chat_ingest.journal")
+# Messages the database refuses, one JSON line each with the error
+CHAT_DEAD_LETTER_PATH = os.getenv("CHAT_DEAD_LETTER_PATH", "chat_ingest.deadletter")
+CHAT_EXPIRY_DAYS = 5
+
+# Failures of the database rather than of a message: retry the batch as is
+DATABASE_ERRORS = (InterfaceError, OperationalError, ProgrammingError)
+
+
+class ChatIngestBuffer:
+    """Write-behind queue for chat history.
+
+    Accepted messages are fsynced to a local journal and kept in memory. A
+    flusher thread writes them with one bulk insert every CHAT_FLUSH_MS or
+    as soon as CHAT_FLUSH_SIZE are waiting, and after each committed batch
+    rewrites the journal with only the messages still pending. Messages left
+    in the journal by a crash are inserted on the next start, so delivery is
+    at least once.
+
+    A batch the database refuses is split in halves until the messages at
+    fault are found; those go to the dead-letter file and the rest is
+    inserted, so one bad message does not hold up the queue.
+    """
+
+    def __init__(
+        self,
+        journal_path: str = CHAT_JOURNAL_PATH,
+        dead_letter_path: str = CHAT_DEAD_LETTER_PATH,
+    ):
+        self.journal_path = journal_path
+        self.dead_letter_path = dead_letter_path
+        self._pending = []
+        self._journal = None
+        self._thread = None
+        self._stopping = False
+        self._cond = threading.Condition()
+        self._active_ids = set()
+        self._active_ids_at = 0.0
+        self._stats = {
+            "accepted": 0,
+            "flushed": 0,
+            "rejected": 0,
+            "flush_errors": 0,
+            "dead_lettered": 0,
+            "last_flush_ms": None,
+            "last_flush_size": 0,
+        }
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._replay_journal()
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+            self._stopping = False
+            self._thread = threading.Thread(
+                target=self._run, name="chat-ingest", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        # Flushes everything still buffered before returning
+        with self._cond:
+            if self._thread is None:
+                return
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join()
+        with self._cond:
+            self._thread = None
+            self._journal.close()
+            self._journal = None
+
+    def _replay_journal(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, encoding="utf-8") as journal:
+            records = [json.loads(line) for line in journal if line.strip()]
+        if records:
+            self._insert_records(records, [0])
+            logging.info(f"Replayed {len(records)} chat messages from the journal")
+        open(self.journal_path, "w").close()
+
+    def _is_active(self, db: Session, employee_id: str) -> bool:
+        if time.monotonic() - self._active_ids_at > CHAT_ACTIVE_IDS_SECONDS:
+            self._active_ids = {
+                employee_id
+                for (employee_id,) in db.query(
+                    EmployeeEmploymentDetails.employee_id
+                ).filter(EmployeeEmploymentDetails.is_active == True)  # noqa: E712
+            }
+            self._active_ids_at = time.monotonic()
+        if employee_id in self._active_ids:
+            return True
+        # Employees added since the last refresh
+        found = (
+            db.query(EmployeeEmploymentDetails.id)
+            .filter(
+                EmployeeEmploymentDetails.employee_id == employee_id,
+                EmployeeEmploymentDetails.is_active == True,  # noqa: E712
+            )
+            .first()
+        )
+        if found:
+            self._active_ids.add(employee_id)
+        return found is not None
+
+    def submit(self, db: Session, employee_id: str, question: str, response: str):
+        if not self._is_active(db, employee_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Employee '{employee_id}' is Not Found",
+            )
+        if self._thread is None:
+            self.start()
+        now = datetime.now()
+        record = {
+            "employee_id": employee_id,
+            "question": question,
+            "response": response,
+            "timestamp": now.isoformat(),
+            "expiration_timestamp": (
+                now + timedelta(days=CHAT_EXPIRY_DAYS)
+            ).isoformat(),
+        }
+        with self._cond:
+            if len(self._pending) >= CHAT_BUFFER_LIMIT:
+                self._stats["rejected"] += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Chat history is busy, please retry shortly.",
+                    headers={"Retry-After": "1"},
+                )
+            self._journal.write(json.dumps(record) + "\n")
+            self._journal.flush()
+            # Accepted means on disk, not in the page cache
+            os.fsync(self._journal.fileno())
+            self._pending.append(record)
+            self._stats["accepted"] += 1
+            if len(self._pending) >= CHAT_FLUSH_SIZE:
+                self._cond.notify()
+        return record
+
+    @staticmethod
+    def _row(record: dict) -> dict:
+        return {
+            **record,
+            "timestamp": datetime.fromisoformat(record["timestamp"]),
+            "expiration_timestamp": datetime.fromisoformat(
+                record["expiration_timestamp"]
+            ),
+        }
+
+    @staticmethod
+    def _insert(rows: list):
+        db = SessionLocal()
+        try:
+            db.bulk_insert_mappings(ChatHistory, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        try:
+            chat_search.add_many(rows)
+        except Exception as e:
+            # Search lags behind until the index is rebuilt, history is intact
+            logging.error(f"Chat search index update failed: {e}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopping and len(self._pending) < CHAT_FLUSH_SIZE:
+                    self._cond.wait(CHAT_FLUSH_MS / 1000)
+                batch = self._pending[:CHAT_FLUSH_SIZE]
+                del self._pending[: len(batch)]
+                stopping = self._stopping
+            if batch:
+                self._flush(batch)
+            elif stopping:
+                return
+
+    def _insert_records(self, records: list, done: list):
+        # Inserts records in order, bisecting on a failure caused by the data.
+        # done[0] counts the records committed or dead-lettered so far, so a
+        # transient error part way through only requeues the rest.
+        try:
+            self._insert([self._row(record) for record in records])
+        except DATABASE_ERRORS:
+            raise
+        except Exception as e:
+            if len(records) == 1:
+                self._dead_letter(records[0], e)
+            else:
+                middle = len(records) // 2
+                self._insert_records(records[:middle], done)
+                self._insert_records(records[middle:], done)
+                return
+        done[0] += len(records)
+
+    def _dead_letter(self, record: dict, error: Exception):
+        logging.error(f"Chat message of {record.get('employee_id')} refused: {error}")
+        entry = {
+            "record": record,
+            "error": str(error),
+            "failed_at": datetime.now().isoformat(),
+        }
+        with open(self.dead_letter_path, "a", encoding="utf-8") as dead_letters:
+            dead_letters.write(json.dumps(entry, default=str) + "\n")
+            dead_letters.flush()
+            os.fsync(dead_letters.fileno())
+        with self._cond:
+            self._stats["dead_lettered"] += 1
+
+    def _compact_journal(self):
+        # Called with the lock held: the journal keeps only what is pending.
+        # The new journal is synced before it replaces the old one; should the
+        # rename itself be lost, the old journal only adds duplicates.
+        if not self._pending:
+            self._journal.truncate(0)
+            os.fsync(self._journal.fileno())
+            return
+        temporary = f"{self.journal_path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as journal:
+            journal.writelines(json.dumps(record) + "\n" for record in self._pending)
+            journal.flush()
+            os.fsync(journal.fileno())
+        self._journal.close()
+        os.replace(temporary, self.journal_path)
+        self._journal = open(self.journal_path, "a", encoding="utf-8")
+
+    def _flush(self, batch: list):
+        start = time.perf_counter()
+        dead_before = self._stats["dead_lettered"]
+        done = [0]
+        try:
+            self._insert_records(batch, done)
+        except Exception as e:
+            logging.error(f"Chat history flush of {len(batch)} failed: {e}")
+            with self._cond:
+                # What is left goes back to the front of the queue
+                self._pending[:0] = batch[done[0] :]
+                self._stats["flush_errors"] += 1
+                self._compact_journal()
+                stopping = self._stopping
+                if stopping:
+                    # Leave them to the journal replay of the next start
+                    self._pending.clear()
+            if not stopping:
+                time.sleep(1)
+            return
+        with self._cond:
+            dead = self._stats["dead_lettered"] - dead_before
+            self._stats["flushed"] += len(batch) - dead
+            self._stats["last_flush_ms"] = round(
+                (time.perf_counter() - start) * 1000, 2
+            )
+            self._stats["last_flush_size"] = len(batch)
+            self._compact_journal()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                **self._stats,
+                "pending": len(self._pending),
+                "buffer_limit": CHAT_BUFFER_LIMIT,
+                "running": self._thread is not None,
+            }
+
+
+chat_ingest = ChatIngestBuffer()
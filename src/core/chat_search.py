@@ -0,0 +1,151 @@
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+# Side index next to the main database: the chat columns themselves are not
+# searchable in place, so question and response are indexed here on insert
+CHAT_SEARCH_PATH = os.getenv("CHAT_SEARCH_PATH", "chat_search.db")
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS chat_fts USING fts5(
+    employee_id,
+    question,
+    response,
+    timestamp UNINDEXED,
+    expiration_timestamp UNINDEXED,
+    tokenize = 'porter unicode61'
+)
+"""
+
+
+def _match_expression(employee_id: str, query: str) -> str | None:
+    # Every word of the query must appear, the last one may be a prefix. The
+    # words are quoted so FTS5 operators in user input are taken literally.
+    # The employee phrase only narrows the match: it matches on tokens, so
+    # "emp-1" also finds "emp-1-2"; search() checks the id for equality.
+    words = re.findall(r"\w+", query.lower())
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words[:-1]] + [f'"{words[-1]}"*']
+    employee = employee_id.replace('"', '""')
+    return (
+        f'employee_id : "{employee}" AND {{question response}} : ({" ".join(terms)})'
+    )
+
+
+def _iso(value) -> str | None:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class ChatSearchIndex:
+    """FTS5 index of chat history, one row per chat turn.
+
+    Results are ranked with bm25, where a match in the question counts twice
+    as much as one in the response.
+    """
+
+    def __init__(self, path: str = CHAT_SEARCH_PATH):
+        self.path = path
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            connection = sqlite3.connect(
+                self.path, timeout=30, check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def add_many(self, messages):
+        # messages: dicts or rows with the ChatHistory column names
+        rows = [
+            (
+                message["employee_id"],
+                message["question"] or "",
+                message["response"] or "",
+                _iso(message["timestamp"]),
+                _iso(message["expiration_timestamp"]),
+            )
+            for message in messages
+        ]
+        if not rows:
+            return
+        with self._lock:
+            connection = self._connect()
+            connection.executemany(
+                "INSERT INTO chat_fts (employee_id, question, response, timestamp, "
+                "expiration_timestamp) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            connection.commit()
+
+    def delete_expired(self, now: datetime) -> int:
+        with self._lock:
+            connection = self._connect()
+            deleted = connection.execute(
+                "DELETE FROM chat_fts WHERE expiration_timestamp < ?",
+                (now.isoformat(),),
+            ).rowcount
+            connection.commit()
+        return deleted
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute("SELECT 1 FROM chat_fts LIMIT 1").fetchone()
+        return row is None
+
+    def clear(self):
+        with self._lock:
+            connection = self._connect()
+            connection.execute("DELETE FROM chat_fts")
+            connection.commit()
+
+    def search(self, employee_id: str, query: str, limit: int, offset: int):
+        match = _match_expression(employee_id, query)
+        if match is None:
+            return {"total": 0, "next_offset": None, "results": []}
+        with self._lock:
+            connection = self._connect()
+            total = connection.execute(
+                "SELECT count(*) FROM chat_fts "
+                "WHERE chat_fts MATCH ? AND employee_id = ?",
+                (match, employee_id),
+            ).fetchone()[0]
+            rows = connection.execute(
+                "SELECT highlight(chat_fts, 1, '[', ']'), "
+                "snippet(chat_fts, 2, '[', ']', '...', 24), "
+                "timestamp, bm25(chat_fts, 0.0, 2.0, 1.0) AS score "
+                "FROM chat_fts WHERE chat_fts MATCH ? AND employee_id = ? "
+                "ORDER BY score, timestamp DESC LIMIT ? OFFSET ?",
+                (match, employee_id, limit, offset),
+            ).fetchall()
+        next_offset = offset + limit if offset + limit < total else None
+        return {
+            "total": total,
+            "next_offset": next_offset,
+            "results": [
+                {
+                    "Question": question,
+                    "Answer": snippet,
+                    "History_create": timestamp,
+                    # bm25 is lower for better matches
+                    "score": round(-score, 4),
+                }
+                for question, snippet, timestamp, score in rows
+            ],
+        }
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+chat_search = ChatSearchIndex()
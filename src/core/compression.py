@@ -0,0 +1,81 @@
+import zlib
+
+from sqlalchemy import LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+# Stored layout: MAGIC, one byte of dictionary version, raw deflate stream.
+# UTF-8 text never starts with NUL, so anything else is a plain text value,
+# either legacy data or a value too short to gain from compression.
+MAGIC = b"\x00"
+
+# Preset dictionaries for chat text, by version. Never change a published
+# version, rows compressed with it need it to be read; add a new one instead
+# (scripts/train_chat_dictionary.py builds one from existing history).
+CHAT_DICTIONARIES = {
+    1: (
+        " Please contact your HR team for more details. If you have any other "
+        "questions, feel free to ask. Here is the information you requested: "
+        "employee id, department, designation, reporting manager, work location, "
+        "date of joining, basic salary, salary slip, pay period, net pay, "
+        "deductions, payroll, holiday calendar, working days, public holiday, "
+        "sick leave, personal leave, vacation leave, unpaid leave, leave balance, "
+        "leave request, leave status is pending, approved, rejected by your team "
+        "lead. You can apply for leave from the leave section. Your remaining "
+        "leave balance is: The policy states that employees are eligible for "
+        "I'm sorry, I couldn't find any information about that. Based on the "
+        "company policy, you are entitled to the following: \n\n1. **"
+    ).encode(),
+}
+CURRENT_DICTIONARY = max(CHAT_DICTIONARIES)
+
+# Shorter values are stored as they are
+MIN_COMPRESS_BYTES = 64
+
+
+def compress_text(value: str, version: int = CURRENT_DICTIONARY) -> bytes:
+    data = value.encode()
+    if len(data) < MIN_COMPRESS_BYTES and not data.startswith(MAGIC):
+        return data
+    compressor = zlib.compressobj(
+        level=6, wbits=-15, zdict=CHAT_DICTIONARIES[version]
+    )
+    packed = compressor.compress(data) + compressor.flush()
+    if len(packed) + 2 >= len(data) and not data.startswith(MAGIC):
+        return data
+    return MAGIC + bytes([version]) + packed
+
+
+def decompress_text(value) -> str:
+    if isinstance(value, str):
+        # Legacy row read through a text column
+        return value
+    value = bytes(value)
+    if not value.startswith(MAGIC):
+        return value.decode()
+    decompressor = zlib.decompressobj(
+        wbits=-15, zdict=CHAT_DICTIONARIES[value[1]]
+    )
+    return (decompressor.decompress(value[2:]) + decompressor.flush()).decode()
+
+
+def is_compressed(value) -> bool:
+    return isinstance(value, (bytes, bytearray, memoryview)) and bytes(
+        value[:1]
+    ) == MAGIC
+
+
+class CompressedText(TypeDecorator):
+    """Text stored deflate-compressed with a preset chat dictionary."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return decompress_text(value)
@@ -10,6 +10,13 @@ ECOM_DB_URL = os.getenv("ECOM_DB_URL")
 
 ecom_engine = create_engine(ECOM_DB_URL, pool_pre_ping=True)
 
+# Ad-hoc queries of /products/query; point it at a read-only database user
+ECOM_READONLY_DB_URL = os.getenv("ECOM_READONLY_DB_URL", ECOM_DB_URL)
+
+ecom_readonly_engine = create_engine(
+    ECOM_READONLY_DB_URL, pool_pre_ping=True, pool_size=2, max_overflow=3
+)
+
 EcomSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=ecom_engine)
 
 EcomBase = declarative_base()
@@ -0,0 +1,277 @@
+import logging
+import os
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from sqlalchemy.orm import Session
+
+from src.core.database import SessionLocal
+from src.models.email import EmailOutbox, EmailStatus
+
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+# Servers drop idle clients, reconnect instead of finding out on the next send
+SMTP_IDLE_SECONDS = int(os.getenv("SMTP_IDLE_SECONDS", 60))
+
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", 50))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", 6))
+MAIL_RETRY_SECONDS = int(os.getenv("MAIL_RETRY_SECONDS", 30))
+MAIL_POLL_SECONDS = int(os.getenv("MAIL_POLL_SECONDS", 5))
+# How long a digest collects notifications before it is sent
+MAIL_DIGEST_SECONDS = int(os.getenv("MAIL_DIGEST_SECONDS", 60))
+# Sent and failed emails are deleted this long after they were queued
+MAIL_RETENTION_DAYS = int(os.getenv("MAIL_RETENTION_DAYS", 30))
+MAIL_PURGE_BATCH = 1000
+
+
+def enqueue_email(
+    db: Session,
+    recipient: str,
+    subject: str,
+    body: str,
+    attachment: bytes | None = None,
+    attachment_name: str | None = None,
+    digest_key: str | None = None,
+):
+    # Added to the caller's session and committed with its transaction. A
+    # digest email waits for the window so later notifications to the same
+    # key go out with it
+    delay = MAIL_DIGEST_SECONDS if digest_key else 0
+    email = EmailOutbox(
+        recipient=recipient,
+        subject=subject,
+        body=body,
+        attachment=attachment,
+        attachment_name=attachment_name,
+        digest_key=digest_key,
+        status=EmailStatus.PENDING,
+        attempts=0,
+        next_attempt_at=datetime.now() + timedelta(seconds=delay),
+    )
+    db.add(email)
+    db.flush()
+    return email
+
+
+class SMTPConnection:
+    """One SMTP session kept open across sends and delivery runs.
+
+    STARTTLS and login happen once per connection instead of once per
+    message. Login is skipped when no password is configured, as with a
+    local relay.
+    """
+
+    def __init__(self):
+        self._server = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30)
+        if SMTP_STARTTLS:
+            server.starttls()
+        password = os.getenv("EMAIL_PASSWORD")
+        if password:
+            server.login(os.getenv("SENDER_EMAIL"), password)
+        return server
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+        self._server = None
+
+    def send(self, message):
+        with self._lock:
+            if (
+                self._server is None
+                or time.monotonic() - self._last_used > SMTP_IDLE_SECONDS
+            ):
+                self._close()
+                self._server = self._open()
+            try:
+                self._server.send_message(message)
+            except smtplib.SMTPServerDisconnected:
+                self._server = self._open()
+                self._server.send_message(message)
+            self._last_used = time.monotonic()
+
+
+smtp_connection = SMTPConnection()
+
+
+def build_message(emails: list):
+    first = emails[0]
+    message = MIMEMultipart()
+    message["From"] = os.getenv("SENDER_EMAIL")
+    message["To"] = first.recipient
+    if len(emails) == 1:
+        message["Subject"] = first.subject
+        body = first.body
+    else:
+        message["Subject"] = f"{first.subject} ({len(emails)} updates)"
+        body = f"You have {len(emails)} updates:\n\n" + "\n\n".join(
+            email.body for email in emails
+        )
+    message.attach(MIMEText(body, "plain"))
+    if first.attachment is not None:
+        attachment = MIMEApplication(first.attachment, Name=first.attachment_name)
+        attachment["Content-Disposition"] = (
+            f'attachment; filename="{first.attachment_name}"'
+        )
+        message.attach(attachment)
+    return message
+
+
+def _group_digests(db: Session, emails: list) -> list:
+    # A due digest email takes every pending email of its key along, due or not
+    groups = {}
+    for email in emails:
+        groups.setdefault(email.digest_key or email.id, []).append(email)
+    claimed = [email.id for email in emails]
+    for key, group in groups.items():
+        if isinstance(key, str):
+            group.extend(
+                db.query(EmailOutbox)
+                .filter(
+                    EmailOutbox.digest_key == key,
+                    EmailOutbox.status == EmailStatus.PENDING,
+                    EmailOutbox.id.notin_(claimed),
+                )
+                .order_by(EmailOutbox.id)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+    return list(groups.values())
+
+
+CONNECTION_ERRORS = (
+    smtplib.SMTPConnectError,
+    smtplib.SMTPHeloError,
+    smtplib.SMTPAuthenticationError,
+    smtplib.SMTPServerDisconnected,
+    OSError,
+)
+
+
+def _retry_later(email: EmailOutbox, error: Exception):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= MAIL_MAX_ATTEMPTS:
+        email.status = EmailStatus.FAILED
+    else:
+        delay = MAIL_RETRY_SECONDS * 2 ** (email.attempts - 1)
+        email.next_attempt_at = datetime.now() + timedelta(seconds=delay)
+
+
+def deliver_outbox(batch_size: int = MAIL_BATCH_SIZE) -> dict:
+    # Scheduler job with its own session. Rows are claimed with SKIP LOCKED so
+    # several app processes can run the job without sending twice.
+    db = SessionLocal()
+    sent = retried = failed = 0
+    try:
+        while True:
+            emails = (
+                db.query(EmailOutbox)
+                .filter(
+                    EmailOutbox.status == EmailStatus.PENDING,
+                    EmailOutbox.next_attempt_at <= datetime.now(),
+                )
+                .order_by(EmailOutbox.id)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            if not emails:
+                break
+            server_down = None
+            for group in _group_digests(db, emails):
+                if server_down is not None:
+                    for email in group:
+                        _retry_later(email, server_down)
+                    retried += len(group)
+                    continue
+                try:
+                    smtp_connection.send(build_message(group))
+                except CONNECTION_ERRORS as e:
+                    # No usable connection, the rest of the batch would fail too
+                    logging.error(f"SMTP delivery failed: {e}")
+                    smtp_connection.close()
+                    server_down = e
+                    for email in group:
+                        _retry_later(email, e)
+                    retried += len(group)
+                except smtplib.SMTPException as e:
+                    # Refused by the server, only this message is affected
+                    for email in group:
+                        _retry_later(email, e)
+                    retried += len(group)
+                except Exception as e:
+                    # A message that cannot be built or sent will not be on a
+                    # retry either; fail it and go on with the batch
+                    logging.error(f"Email {group[0].id} failed: {e}")
+                    smtp_connection.close()
+                    for email in group:
+                        email.attempts += 1
+                        email.status = EmailStatus.FAILED
+                        email.last_error = str(e)
+                    failed += len(group)
+                else:
+                    for email in group:
+                        email.attempts += 1
+                        email.status = EmailStatus.SENT
+                        email.sent_at = datetime.now()
+                        email.last_error = None
+                        # Bodies may hold credentials, keep only the envelope
+                        email.body = ""
+                        email.attachment = None
+                    sent += len(group)
+            db.commit()
+            if server_down is not None or len(emails) < batch_size:
+                break
+    finally:
+        db.close()
+    return {"sent": sent, "retried": retried, "failed": failed}
+
+
+def purge_outbox(
+    retention_days: int = MAIL_RETENTION_DAYS, batch_size: int = MAIL_PURGE_BATCH
+) -> int:
+    # Scheduler job, in batches like the chat history purge. Pending emails
+    # are kept whatever their age.
+    cutoff = datetime.now() - timedelta(days=retention_days)
+    purged = 0
+    while True:
+        db = SessionLocal()
+        try:
+            ids = [
+                email_id
+                for (email_id,) in db.query(EmailOutbox.id)
+                .filter(
+                    EmailOutbox.status.in_([EmailStatus.SENT, EmailStatus.FAILED]),
+                    EmailOutbox.created_at < cutoff,
+                )
+                .limit(batch_size)
+            ]
+            if ids:
+                db.query(EmailOutbox).filter(EmailOutbox.id.in_(ids)).delete(
+                    synchronize_session=False
+                )
+                db.commit()
+        finally:
+            db.close()
+        purged += len(ids)
+        if len(ids) < batch_size:
+            return purged
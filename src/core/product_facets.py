@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import (
+    String,
+    case,
+    cast,
+    func,
+    literal,
+    literal_column,
+    select,
+    union_all,
+)
+
+from src.models.ecommerce_models import Product, ProductTag
+
+FACET_CACHE_SIZE = int(os.getenv("FACET_CACHE_SIZE", 512))
+# Product syncs clear the cache, the TTL covers changes made outside a sync
+FACET_CACHE_SECONDS = int(os.getenv("FACET_CACHE_SECONDS", 300))
+
+PRICE_BUCKETS = (0, 25, 50, 100, 250, 500, 1000)
+RATING_BUCKETS = (0, 1, 2, 3, 4)
+
+
+def _bucket_labels(edges: tuple) -> list:
+    return [f"{low}-{high}" for low, high in zip(edges, edges[1:])] + [
+        f"{edges[-1]}+"
+    ]
+
+
+def _bucket(column, edges: tuple):
+    labels = _bucket_labels(edges)
+    return case(
+        *[(column >= low, label) for low, label in reversed(list(zip(edges, labels)))],
+        else_=None,
+    )
+
+
+def facet_counts(db, product_ids) -> dict:
+    """Counts per facet value for the products selected by product_ids.
+
+    product_ids is a query of Product.id. All facets come from one UNION ALL
+    statement over the filtered ids, so one round trip whatever their number.
+    """
+    ids = product_ids.cte("facet_ids")
+    product_facets = {
+        "category": Product.category,
+        "brand": Product.brand,
+        "availability_status": Product.availability_status,
+        "price": _bucket(Product.price, PRICE_BUCKETS),
+        "rating": _bucket(Product.rating, RATING_BUCKETS),
+    }
+    selects = [
+        select(
+            literal(name).label("facet"),
+            cast(value, String).label("value"),
+            func.count().label("count"),
+        )
+        .select_from(Product)
+        .join(ids, ids.c.id == Product.id)
+        # By the alias: MySQL does not match the bucket CASE in GROUP BY to
+        # the one in the select list, their parameters are bound separately
+        .group_by(literal_column("value"))
+        for name, value in product_facets.items()
+    ]
+    selects.append(
+        select(
+            literal("tag").label("facet"),
+            cast(ProductTag.tag, String).label("value"),
+            func.count().label("count"),
+        )
+        .select_from(ProductTag)
+        .join(ids, ids.c.id == ProductTag.product_id)
+        .group_by(ProductTag.tag)
+    )
+
+    facets = {name: [] for name in [*product_facets, "tag"]}
+    for facet, value, count in db.execute(union_all(*selects)):
+        facets[facet].append({"value": value, "count": count})
+    # Buckets in their natural order, other values by count
+    bucket_order = {
+        label: i
+        for i, label in enumerate(
+            _bucket_labels(PRICE_BUCKETS) + _bucket_labels(RATING_BUCKETS)
+        )
+    }
+    for name, counts in facets.items():
+        if name in ("price", "rating"):
+            counts.sort(key=lambda c: bucket_order.get(c["value"], -1))
+        else:
+            counts.sort(key=lambda c: (-c["count"], c["value"] or ""))
+    return facets
+
+
+def filter_signature(product_ids) -> tuple:
+    # The compiled SQL and its parameters: filter sets that build the same
+    # query share one cache entry, whatever order the request gave them in
+    compiled = product_ids.statement.compile()
+    params = sorted(
+        (name, tuple(value) if isinstance(value, list) else value)
+        for name, value in compiled.params.items()
+    )
+    return str(compiled), tuple(params)
+
+
+class FacetCache:
+    """Facet counts by filter signature, least recently used dropped first."""
+
+    def __init__(self, max_entries: int = FACET_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._facets = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by clear(), so counts started before it are not stored
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> dict | None:
+        with self._lock:
+            entry = self._facets.get(key)
+            if entry is None or time.monotonic() - entry[0] > FACET_CACHE_SECONDS:
+                self.misses += 1
+                return None
+            self._facets.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, facets: dict, generation: int):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._facets[key] = (time.monotonic(), facets)
+            self._facets.move_to_end(key)
+            while len(self._facets) > self.max_entries:
+                self._facets.popitem(last=False)
+
+    def get_or_count(self, db, product_ids) -> dict:
+        key = filter_signature(product_ids)
+        facets = self.get(key)
+        if facets is None:
+            generation = self._generation
+            facets = facet_counts(db, product_ids)
+            self.put(key, facets, generation)
+        return facets
+
+    def clear(self):
+        with self._lock:
+            self._facets.clear()
+            self._generation += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._facets),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+facet_cache = FacetCache()
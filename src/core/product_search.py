@@ -0,0 +1,191 @@
+import logging
+import math
+import os
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from src.core.ecommerce_database import EcomSessionLocal
+from src.models.ecommerce_models import Product, ProductTag
+
+# Other workers pick up a sync made elsewhere within this interval
+PRODUCT_SEARCH_REFRESH_MINUTES = int(os.getenv("PRODUCT_SEARCH_REFRESH_MINUTES", 10))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Words in the title count this many times
+TITLE_WEIGHT = 2
+# Most vocabulary words a prefix is expanded to, in alphabetical order
+MAX_PREFIX_TERMS = 2000
+
+TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str | None) -> list:
+    return TOKEN.findall(text.lower()) if text else []
+
+
+class ProductSearchIndex:
+    """Inverted index of the product catalog, ranked with BM25.
+
+    Title, description, brand and tags of every product are indexed. Each
+    posting list holds product ids and their precomputed BM25 weight, so a
+    search only looks up and intersects lists. A rebuild swaps in a new index
+    at once, searches never wait for it.
+    """
+
+    def __init__(self):
+        # (sorted vocabulary, {term: (product ids, weights)})
+        self._index = None
+        self._build_lock = threading.Lock()
+        self.products = 0
+        self.built_at = None
+        self.build_ms = None
+
+    @property
+    def ready(self) -> bool:
+        return self._index is not None
+
+    def build(self):
+        with self._build_lock:
+            start = time.perf_counter()
+            db = EcomSessionLocal()
+            try:
+                tags = defaultdict(list)
+                for product_id, tag in db.query(ProductTag.product_id, ProductTag.tag):
+                    tags[product_id].append(tag)
+                documents = {
+                    product_id: Counter(
+                        tokenize(title) * TITLE_WEIGHT
+                        + tokenize(description)
+                        + tokenize(brand)
+                        + [token for tag in tags[product_id] for token in tokenize(tag)]
+                    )
+                    for product_id, title, description, brand in db.query(
+                        Product.id, Product.title, Product.description, Product.brand
+                    )
+                }
+            finally:
+                db.close()
+
+            self._index = self._postings(documents)
+            self.products = len(documents)
+            self.built_at = time.time()
+            self.build_ms = round((time.perf_counter() - start) * 1000, 1)
+            logging.info(
+                f"Product search index: {self.products} products in {self.build_ms} ms"
+            )
+
+    @staticmethod
+    def _postings(documents: dict):
+        average_length = sum(
+            sum(counts.values()) for counts in documents.values()
+        ) / max(len(documents), 1)
+        frequencies = defaultdict(lambda: (array("i"), array("f")))
+        # Posting lists sorted by product id, for lookups by bisection
+        for product_id, counts in sorted(documents.items()):
+            norm = BM25_K1 * (
+                1 - BM25_B + BM25_B * sum(counts.values()) / average_length
+            )
+            for term, tf in counts.items():
+                ids, weights = frequencies[term]
+                ids.append(product_id)
+                weights.append(tf * (BM25_K1 + 1) / (tf + norm))
+        postings = {}
+        for term, (ids, weights) in frequencies.items():
+            idf = math.log(1 + (len(documents) - len(ids) + 0.5) / (len(ids) + 0.5))
+            postings[term] = (ids, array("f", (w * idf for w in weights)))
+        return sorted(postings), postings
+
+    @staticmethod
+    def _term_postings(index, word: str, prefix: bool) -> list:
+        vocabulary, postings = index
+        if not prefix:
+            return [postings[word]] if word in postings else []
+        start = bisect_left(vocabulary, word)
+        terms = []
+        for term in vocabulary[start : start + MAX_PREFIX_TERMS]:
+            if not term.startswith(word):
+                break
+            terms.append(postings[term])
+        return terms
+
+    @staticmethod
+    def _weight(term_postings: list, product_id: int) -> float | None:
+        # Best weight of the product over the posting lists of one query word
+        best = None
+        for ids, weights in term_postings:
+            i = bisect_left(ids, product_id)
+            if i < len(ids) and ids[i] == product_id:
+                if best is None or weights[i] > best:
+                    best = weights[i]
+        return best
+
+    def search(self, query: str) -> dict | None:
+        """Product ids matching every word of query, best first, with scores.
+
+        The last word also matches as a prefix, equal scores are in id order.
+        None when the index is not built yet or the query has no words.
+        """
+        index = self._index
+        words = tokenize(query)
+        if index is None or not words:
+            return None
+        words = [
+            self._term_postings(index, word, prefix=i == len(words) - 1)
+            for i, word in enumerate(words)
+        ]
+        # Candidates from the rarest word, then looked up in the other lists
+        words.sort(key=lambda postings: sum(len(ids) for ids, _ in postings))
+        if len(words[0]) == 1:
+            scores = dict(zip(*words[0][0]))
+        else:
+            scores = {}
+            for ids, weights in words[0]:
+                for product_id, weight in zip(ids, weights):
+                    if weight > scores.get(product_id, 0):
+                        scores[product_id] = weight
+        for term_postings in words[1:]:
+            size = sum(len(ids) for ids, _ in term_postings)
+            if len(term_postings) == 1 and size < 16 * len(scores):
+                # Comparable sizes: a dict of the other list beats bisecting it
+                other = dict(zip(*term_postings[0]))
+                scores = {
+                    product_id: score + other[product_id]
+                    for product_id, score in scores.items()
+                    if product_id in other
+                }
+                continue
+            matched = {}
+            for product_id, score in scores.items():
+                weight = self._weight(term_postings, product_id)
+                if weight is not None:
+                    matched[product_id] = score + weight
+            scores = matched
+        return {
+            product_id: scores[product_id]
+            for product_id in sorted(scores, key=lambda p: (-scores[p], p))
+        }
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "products": self.products,
+            "terms": len(self._index[0]) if self._index else 0,
+            "built_at": self.built_at,
+            "build_ms": self.build_ms,
+        }
+
+
+product_search = ProductSearchIndex()
+
+
+def rebuild_product_search():
+    # Scheduler job and sync hook; a failed build keeps the previous index
+    try:
+        product_search.build()
+    except Exception as e:
+        logging.error(f"Product search index build failed: {e}")
@@ -0,0 +1,251 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import zipfile
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+
+import fitz
+
+SALARY_SLIP_TEMPLATE = "salary_slip.pdf"
+SLIP_CACHE_BYTES = int(os.getenv("SLIP_CACHE_BYTES", 64 * 1024 * 1024))
+
+# Slip values and the names of the template's form fields they fill
+SLIP_FIELDS = {
+    "date_of_joining": "DATEOF JOIN",
+    "pay_period": "pay period",
+    "worked_days": "worked day",
+    "employee_name": "employeename",
+    "designation": "designation",
+    "department": "Department",
+    "total_working_days": "Totalwokin days",
+    "carryover": "carryover",
+    "leave_days": "leave days",
+    "application_leave": "application leave",
+    "fixed_pay": "Fixed pay",
+    "days_allowances": "Days Allownces",
+    "other_deductions": "Other deductions",
+    "loan_deduction": "loan deducction",
+    "absence_deductions": "adbsence deductions",
+    "total_earnings": "Total earings",
+    "total_deductions": "Total deductions",
+    "net_pay": "netpay",
+}
+
+
+def compute_net_pay(basic_salary, working_days: int, unpaid_days: float) -> float:
+    basic_salary = float(basic_salary or 0)
+    per_day = basic_salary / working_days if working_days else 0
+    return basic_salary - per_day * unpaid_days
+
+
+def compute_salary_slip(
+    basic_salary,
+    working_days: int,
+    unpaid_days: float,
+    date_of_joining,
+    pay_period,
+    employee_name: str,
+    designation: str,
+    department: str,
+) -> dict:
+    basic_salary = float(basic_salary or 0)
+    deductions = basic_salary - compute_net_pay(basic_salary, working_days, unpaid_days)
+    return {
+        "date_of_joining": date_of_joining.strftime("%d-%m-%Y"),
+        "pay_period": pay_period.strftime("%d-%m-%Y"),
+        "worked_days": working_days - unpaid_days,
+        "employee_name": employee_name,
+        "designation": designation,
+        "department": department,
+        "total_working_days": working_days,
+        "carryover": "0",
+        "leave_days": round(unpaid_days),
+        "application_leave": "0",
+        "fixed_pay": round(basic_salary),
+        "days_allowances": "0",
+        "other_deductions": round(deductions),
+        "loan_deduction": "0",
+        "absence_deductions": "0",
+        "total_earnings": round(basic_salary),
+        "total_deductions": round(deductions),
+        "net_pay": round(basic_salary - deductions),
+    }
+
+
+SlipField = namedtuple("SlipField", "name rect fontsize color right_aligned")
+
+
+class SalarySlipTemplate:
+    """The salary slip template, flattened once and drawn on for every slip.
+
+    The form widgets are removed from the template and their position and
+    text style are kept in ``fields``, matched to slip values by the field
+    names in SLIP_FIELDS. A slip is the flat page plus text, not a fillable
+    form.
+    """
+
+    def __init__(self, path: str):
+        template = fitz.open(path)
+        page = template[0]
+        widgets = {}
+        for widget in page.widgets():
+            alignment = template.xref_get_key(widget.xref, "Q")[1]
+            widgets[widget.field_name] = SlipField(
+                widget.field_name,
+                fitz.Rect(widget.rect),
+                widget.text_fontsize or 8,
+                tuple(widget.text_color or (0, 0, 0)),
+                alignment == "2",
+            )
+        missing = sorted(set(SLIP_FIELDS.values()) - set(widgets))
+        if missing:
+            template.close()
+            raise ValueError(f"{path} has no form field {', '.join(missing)}")
+        self.fields = {name: widgets[field] for name, field in SLIP_FIELDS.items()}
+
+        for widget in list(page.widgets()):
+            page.delete_widget(widget)
+        self.page_rect = fitz.Rect(page.rect)
+        self.flat = fitz.open("pdf", template.tobytes(garbage=3, deflate=True))
+        template.close()
+        # MuPDF documents are not safe to share between threads
+        self._lock = threading.Lock()
+
+    def _draw(self, page, slip: dict):
+        # One shape keeps all the slip text in a single content stream
+        shape = page.new_shape()
+        for name, field in self.fields.items():
+            text = str(slip[name])
+            if field.right_aligned:
+                width = fitz.get_text_length(
+                    text, fontname="helv", fontsize=field.fontsize
+                )
+                x = field.rect.x1 - 2 - width
+            else:
+                x = field.rect.x0 + 2
+            # Baseline vertically centred in the former widget
+            y = field.rect.y0 + (field.rect.height + field.fontsize * 0.7) / 2
+            shape.insert_text(
+                (x, y),
+                text,
+                fontname="helv",
+                fontsize=field.fontsize,
+                color=field.color,
+            )
+        shape.commit()
+
+    def render_many(self, slips) -> bytes:
+        # All pages show the same flat template XObject, so a batch grows by
+        # the slip text only
+        document = fitz.open()
+        with self._lock:
+            for slip in slips:
+                page = document.new_page(
+                    width=self.page_rect.width, height=self.page_rect.height
+                )
+                page.show_pdf_page(page.rect, self.flat, 0)
+                self._draw(page, slip)
+            pdf_stream = io.BytesIO()
+            document.save(pdf_stream, garbage=1, deflate=True)
+        document.close()
+        return pdf_stream.getvalue()
+
+
+@lru_cache(maxsize=None)
+def get_salary_slip_template(path: str = SALARY_SLIP_TEMPLATE) -> SalarySlipTemplate:
+    return SalarySlipTemplate(path)
+
+
+def render_salary_slip(slip: dict) -> bytes:
+    # Top level and picklable so payroll runs can call it from a process pool,
+    # each worker process loads the template once
+    return get_salary_slip_template().render_many([slip])
+
+
+def render_salary_slips(slips) -> bytes:
+    # Many slips as the pages of one PDF
+    return get_salary_slip_template().render_many(slips)
+
+
+class _ZipStream:
+    # Write-only target for ZipFile: without seek() the archive is written
+    # strictly forward, so every chunk can be sent as soon as it is produced
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(files):
+    # files yields (filename, pdf bytes); PDFs are compressed already
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_STORED) as archive:
+        for filename, content in files:
+            archive.writestr(filename, content)
+            yield stream.drain()
+    yield stream.drain()
+
+
+def salary_slip_key(employee_id: str, year: int, month: int, slip: dict) -> str:
+    # Content address of a slip: who, which period and every rendered input,
+    # so any change to salary, leave or working days gives a new key
+    payload = json.dumps(
+        [employee_id, year, month, slip], sort_keys=True, default=str
+    ).encode()
+    return hashlib.sha256(payload).hexdigest()
+
+
+class SalarySlipCache:
+    """Rendered slips by content address, least recently used dropped first.
+
+    Bounded by the total size of the PDFs rather than their number.
+    """
+
+    def __init__(self, max_bytes: int = SLIP_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._slips = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            pdf = self._slips.get(key)
+            if pdf is not None:
+                self._slips.move_to_end(key)
+            return pdf
+
+    def put(self, key: str, pdf: bytes):
+        if len(pdf) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._slips:
+                self._slips.move_to_end(key)
+                return
+            self._slips[key] = pdf
+            self.size += len(pdf)
+            while self.size > self.max_bytes:
+                _, dropped = self._slips.popitem(last=False)
+                self.size -= len(dropped)
+
+    def get_or_render(self, key: str, slip: dict) -> bytes:
+        pdf = self.get(key)
+        if pdf is None:
+            pdf = render_salary_slip(slip)
+            self.put(key, pdf)
+        return pdf
+
+
+salary_slip_cache = SalarySlipCache()
@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import sqlparse
+from sqlparse import tokens as T
+
+SQL_CACHE_BYTES = int(os.getenv("SQL_CACHE_BYTES", 64 * 1024 * 1024))
+SQL_CACHE_SECONDS = int(os.getenv("SQL_CACHE_SECONDS", 300))
+SQL_PLAN_CACHE_BYTES = int(os.getenv("SQL_PLAN_CACHE_BYTES", 1024 * 1024))
+SQL_PLAN_CACHE_SECONDS = int(os.getenv("SQL_PLAN_CACHE_SECONDS", 3600))
+
+
+def _tokens(sql: str) -> list:
+    cleaned = sqlparse.format(sql, strip_comments=True).strip().rstrip(";")
+    return [
+        token
+        for statement in sqlparse.parse(cleaned)
+        for token in statement.flatten()
+        if not token.is_whitespace
+    ]
+
+
+def normalize_sql(sql: str) -> str:
+    """sql without comments, keywords and function names upper-cased, one
+    space between tokens.
+
+    Literals are kept, so the same key means the same result.
+    """
+    tokens = _tokens(sql)
+    words = []
+    for i, token in enumerate(tokens):
+        if token.ttype in T.Keyword:
+            words.append(token.normalized)
+        elif (
+            token.ttype in T.Name
+            and i + 1 < len(tokens)
+            and tokens[i + 1].value == "("
+        ):
+            # sqlparse leaves function names such as count as plain names
+            words.append(token.value.upper())
+        else:
+            words.append(token.value)
+    return " ".join(words)
+
+
+class QueryCache:
+    """Values by key with a TTL, least recently used dropped first.
+
+    Bounded by the size of the values as JSON. Each entry remembers how long
+    the database took to produce it, so hits report the time they saved.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: int):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by clear(), so values computed before it are not stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() > entry[0]:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_ms += entry[3]
+            return entry[2]
+
+    def put(self, key: str, value, db_ms: float, generation: int):
+        size = len(json.dumps(value, default=str)) + len(key)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            if key in self._entries:
+                self._drop(key)
+            expires = time.monotonic() + self.ttl_seconds
+            self._entries[key] = (expires, size, value, db_ms)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: str):
+        _, size, _, _ = self._entries.pop(key)
+        self.size -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.generation += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "saved_db_ms": round(self.saved_ms, 1),
+            }
+
+
+# Results of /products/query and the EXPLAIN verdict, both by normalize_sql:
+# the cost depends on the literals, `id < 2` and `id < 10000000` must not
+# share a verdict
+query_result_cache = QueryCache(SQL_CACHE_BYTES, SQL_CACHE_SECONDS)
+query_plan_cache = QueryCache(SQL_PLAN_CACHE_BYTES, SQL_PLAN_CACHE_SECONDS)
+
+
+def clear_query_caches():
+    # After a product sync, results may be stale and row counts have moved
+    query_result_cache.clear()
+    query_plan_cache.clear()
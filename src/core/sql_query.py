@@ -0,0 +1,340 @@
+import json
+import math
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import sqlparse
+from fastapi import HTTPException, status
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlparse import tokens as T
+from sqlparse.sql import Identifier
+
+from src.core.ecommerce_database import ecom_readonly_engine
+from src.core.sql_cache import normalize_sql, query_plan_cache, query_result_cache
+
+SQL_QUERY_MAX_ROWS = int(os.getenv("SQL_QUERY_MAX_ROWS", 10000))
+# Streamed rows are not held in memory, so the cap can be higher
+SQL_QUERY_STREAM_MAX_ROWS = int(os.getenv("SQL_QUERY_STREAM_MAX_ROWS", 1_000_000))
+SQL_QUERY_TIMEOUT_MS = int(os.getenv("SQL_QUERY_TIMEOUT_MS", 5000))
+# Covers sending the rows too, which is as slow as the client reads them
+SQL_QUERY_STREAM_TIMEOUT_MS = int(os.getenv("SQL_QUERY_STREAM_TIMEOUT_MS", 60000))
+# Queries the planner estimates above this are refused before they run
+SQL_QUERY_MAX_COST = float(os.getenv("SQL_QUERY_MAX_COST", 5_000_000))
+SQL_QUERY_FETCH_SIZE = 500
+# Size of a buffered result, measured while fetching; above it the query is
+# refused with 413. On SQLite also the largest single value a query may build.
+SQL_QUERY_MAX_BYTES = int(os.getenv("SQL_QUERY_MAX_BYTES", 50_000_000))
+
+# Read a server file, stall a connection or load code: not allowed in a query
+DENIED_FUNCTIONS = {"sleep", "benchmark", "load_file", "get_lock", "load_extension"}
+DENIED_KEYWORDS = {"INTO", "OUTFILE", "DUMPFILE", "LOCK", "SHARE"}
+
+
+def _bad_query(detail: str):
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+
+def parse_select(sql: str):
+    """The single read-only SELECT in sql as a sqlparse statement.
+
+    Comments are stripped first, so keywords cannot hide in them.
+    """
+    cleaned = sqlparse.format(sql, strip_comments=True).strip().rstrip(";").strip()
+    statements = [s for s in sqlparse.parse(cleaned) if s.value.strip()]
+    if len(statements) != 1:
+        _bad_query("Exactly one SQL statement is allowed")
+    statement = statements[0]
+
+    tokens = [t for t in statement.flatten() if not t.is_whitespace]
+    dml = [t.normalized for t in tokens if t.ttype in (T.DML, T.DDL)]
+    if not dml or any(keyword != "SELECT" for keyword in dml):
+        _bad_query("Only SELECT queries are allowed")
+    for i, token in enumerate(tokens):
+        if token.ttype in T.Keyword and token.normalized in DENIED_KEYWORDS:
+            _bad_query(f"{token.normalized} is not allowed in a query")
+        if (
+            token.ttype in T.Name
+            and token.value.lower() in DENIED_FUNCTIONS
+            and i + 1 < len(tokens)
+            and tokens[i + 1].value == "("
+        ):
+            _bad_query(f"{token.value}() is not allowed in a query")
+    return statement
+
+
+def _capped_sql(statement, max_rows: int) -> str:
+    # A LIMIT one past the cap. A query with a LIMIT of its own is wrapped, so
+    # its LIMIT can not lift the cap; the rest keep their columns as written,
+    # a join's duplicate column names are not allowed in a MySQL subquery.
+    has_limit = any(
+        token.ttype in T.Keyword and token.normalized == "LIMIT"
+        for token in statement.tokens
+    )
+    sql = str(statement).strip()
+    if has_limit:
+        return f"SELECT * FROM ({sql}) AS capped LIMIT {max_rows + 1}"
+    return f"{sql} LIMIT {max_rows + 1}"
+
+
+@contextmanager
+def guarded_connection(timeout_ms: int = SQL_QUERY_TIMEOUT_MS):
+    """Read-only connection with a statement timeout, per dialect.
+
+    Settings are undone before the connection goes back to the pool, and
+    the transaction is always rolled back.
+    """
+    connection = ecom_readonly_engine.connect()
+    dialect = connection.dialect.name
+    raw = connection.connection.driver_connection
+    try:
+        if dialect == "mysql":
+            connection.exec_driver_sql("SET SESSION TRANSACTION READ ONLY")
+            connection.exec_driver_sql(f"SET SESSION MAX_EXECUTION_TIME = {timeout_ms}")
+        elif dialect == "postgresql":
+            connection.exec_driver_sql("SET TRANSACTION READ ONLY")
+            connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout_ms}")
+        elif dialect == "sqlite":
+            connection.exec_driver_sql("PRAGMA query_only = ON")
+            length_limit = raw.setlimit(
+                sqlite3.SQLITE_LIMIT_LENGTH, SQL_QUERY_MAX_BYTES
+            )
+            deadline = time.monotonic() + timeout_ms / 1000
+            # A non-zero return interrupts the running statement
+            raw.set_progress_handler(lambda: int(time.monotonic() > deadline), 10000)
+        yield connection
+    finally:
+        try:
+            connection.rollback()
+            if dialect == "mysql":
+                connection.exec_driver_sql("SET SESSION TRANSACTION READ WRITE")
+                connection.exec_driver_sql("SET SESSION MAX_EXECUTION_TIME = 0")
+            elif dialect == "sqlite":
+                raw.set_progress_handler(None, 0)
+                raw.setlimit(sqlite3.SQLITE_LIMIT_LENGTH, length_limit)
+                connection.exec_driver_sql("PRAGMA query_only = OFF")
+            connection.commit()
+        finally:
+            connection.close()
+
+
+def _is_timeout(error: DBAPIError) -> bool:
+    message = str(error.orig).lower()
+    # MySQL 3024, PostgreSQL query_canceled, SQLite progress handler
+    return (
+        getattr(error.orig, "args", [None])[0] == 3024
+        or "statement timeout" in message
+        or "interrupted" in message
+    )
+
+
+def _too_large():
+    raise HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Query result is larger than {SQL_QUERY_MAX_BYTES} bytes; "
+        "select fewer columns or rows",
+    )
+
+
+def _query_error(error: DBAPIError):
+    if _is_timeout(error):
+        raise HTTPException(
+            status_code=status.HTTP_408_REQUEST_TIMEOUT,
+            detail=f"Query exceeded the {SQL_QUERY_TIMEOUT_MS} ms time limit",
+        )
+    # SQLite refusing a value above SQLITE_LIMIT_LENGTH
+    if "too big" in str(error.orig).lower():
+        _too_large()
+    raise HTTPException(status_code=400, detail=str(error.orig))
+
+
+def _table_rows(connection, table: str) -> int:
+    try:
+        rows = connection.execute(text(f'SELECT max(rowid) FROM "{table}"')).scalar()
+    except DBAPIError:
+        connection.rollback()
+        return 1000
+    return rows or 1
+
+
+def _sqlite_cost(connection, statement, plan: list) -> float:
+    # SQLite gives no cost, so estimate one: full scans cost the table's rows,
+    # index searches the log of them. Top-level steps are nested loops and
+    # multiply, the steps of subqueries add.
+    tables = {}
+    for token in statement.get_sublists():
+        stack = [token]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, Identifier) and item.get_real_name():
+                name = item.get_real_name()
+                tables[item.get_alias() or name] = name
+            if item.is_group:
+                stack.extend(item.get_sublists())
+    nested, added = 1.0, 0.0
+    for _, parent, _, detail in plan:
+        words = detail.split()
+        if words[0] not in ("SCAN", "SEARCH") or len(words) < 2:
+            continue
+        rows = _table_rows(connection, tables.get(words[1], words[1]))
+        cost = rows if words[0] == "SCAN" else max(1.0, math.log2(rows))
+        if parent == 0:
+            nested *= cost
+        else:
+            added += cost
+    return nested + added
+
+
+def explain_query(sql: str) -> dict:
+    """The plan of a query and the planner's cost estimate, without running it."""
+    statement = parse_select(sql)
+    capped = _capped_sql(statement, SQL_QUERY_MAX_ROWS)
+    with guarded_connection() as connection:
+        dialect = connection.dialect.name
+        try:
+            if dialect == "mysql":
+                raw = connection.exec_driver_sql(f"EXPLAIN FORMAT=JSON {capped}")
+                plan = json.loads(raw.scalar())
+                cost = float(plan["query_block"]["cost_info"]["query_cost"])
+            elif dialect == "postgresql":
+                raw = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {capped}")
+                plan = raw.scalar()
+                cost = float(plan[0]["Plan"]["Total Cost"])
+            else:
+                rows = connection.exec_driver_sql(
+                    f"EXPLAIN QUERY PLAN {capped}"
+                ).fetchall()
+                plan = [
+                    {"id": row[0], "parent": row[1], "detail": row[3]} for row in rows
+                ]
+                cost = _sqlite_cost(connection, statement, rows)
+        except DBAPIError as e:
+            _query_error(e)
+    return {
+        "dialect": dialect,
+        "cost": cost,
+        "max_cost": SQL_QUERY_MAX_COST,
+        "allowed": cost <= SQL_QUERY_MAX_COST,
+        "plan": plan,
+    }
+
+
+def _checked_sql(sql: str, max_rows: int) -> str:
+    statement = parse_select(sql)
+    key = normalize_sql(sql)
+    verdict = query_plan_cache.get(key)
+    if verdict is None:
+        generation = query_plan_cache.generation
+        start = time.perf_counter()
+        explained = explain_query(sql)
+        verdict = {"cost": explained["cost"], "allowed": explained["allowed"]}
+        query_plan_cache.put(
+            key, verdict, (time.perf_counter() - start) * 1000, generation
+        )
+    if not verdict["allowed"]:
+        _bad_query(
+            f"Estimated query cost {verdict['cost']:.0f} is above the limit of "
+            f"{SQL_QUERY_MAX_COST:.0f}; narrow it down, see /products/query/explain"
+        )
+    return _capped_sql(statement, max_rows)
+
+
+def _row_bytes(row) -> int:
+    return sum(len(value) if isinstance(value, (str, bytes)) else 8 for value in row)
+
+
+def run_query(sql: str) -> dict:
+    """Rows of a guarded query, at most SQL_QUERY_MAX_ROWS and
+    SQL_QUERY_MAX_BYTES of them.
+
+    Results are cached by normalized SQL until they expire or a product sync.
+    """
+    key = normalize_sql(sql)
+    cached = query_result_cache.get(key)
+    if cached is not None:
+        return {**cached, "cached": True}
+    generation = query_result_cache.generation
+
+    capped = _checked_sql(sql, SQL_QUERY_MAX_ROWS)
+    start = time.perf_counter()
+    with guarded_connection() as connection:
+        try:
+            # Passed to the driver as is: no bind parameters to look for
+            result = connection.execution_options(
+                stream_results=True
+            ).exec_driver_sql(capped)
+            columns = list(result.keys())
+            data = []
+            size = 0
+            while len(data) <= SQL_QUERY_MAX_ROWS:
+                rows = result.fetchmany(SQL_QUERY_FETCH_SIZE)
+                if not rows:
+                    break
+                size += sum(_row_bytes(row) for row in rows)
+                if size > SQL_QUERY_MAX_BYTES:
+                    result.close()
+                    _too_large()
+                data.extend(dict(zip(columns, row)) for row in rows)
+            result.close()
+        except DBAPIError as e:
+            _query_error(e)
+    db_ms = (time.perf_counter() - start) * 1000
+    truncated = len(data) > SQL_QUERY_MAX_ROWS
+    data = data[:SQL_QUERY_MAX_ROWS]
+    response = {
+        "row_count": len(data),
+        "truncated": truncated,
+        "columns": columns,
+        "data": data,
+    }
+    query_result_cache.put(key, response, db_ms, generation)
+    return {**response, "cached": False}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def iter_query_ndjson(sql: str):
+    """A guarded query as newline-delimited JSON, up to SQL_QUERY_STREAM_MAX_ROWS.
+
+    Checked before the first line, so a refused query still gets a normal
+    error response. Then one line with the columns, one per row and a last
+    one with the row count; an error after that ends the stream with an
+    error line.
+    """
+    capped = _checked_sql(sql, SQL_QUERY_STREAM_MAX_ROWS)
+
+    def lines():
+        with guarded_connection(SQL_QUERY_STREAM_TIMEOUT_MS) as connection:
+            row_count = 0
+            try:
+                result = connection.execution_options(
+                    stream_results=True
+                ).exec_driver_sql(capped)
+                columns = list(result.keys())
+                yield json.dumps({"columns": columns}) + "\n"
+                truncated = False
+                for row in result:
+                    if row_count == SQL_QUERY_STREAM_MAX_ROWS:
+                        truncated = True
+                        break
+                    row_count += 1
+                    yield json.dumps(
+                        dict(zip(columns, row)), default=_json_default
+                    ) + "\n"
+                result.close()
+            except DBAPIError as e:
+                timeout = _is_timeout(e)
+                yield json.dumps(
+                    {"error": "timeout" if timeout else str(e.orig)}
+                ) + "\n"
+                return
+            yield json.dumps({"row_count": row_count, "truncated": truncated}) + "\n"
+
+    return lines()
@@ -1,19 +1,18 @@
+import base64
 import hashlib
 import io
-import os
+import json
 import random
-import smtplib
 import string
 from datetime import datetime, timedelta
-from email.mime.application import MIMEApplication
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
 
 from dotenv import load_dotenv
 from fastapi import HTTPException
 from passlib.context import CryptContext
 from pydantic import EmailStr
 
+from src.core.mailer import enqueue_email
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
@@ -26,6 +25,39 @@ def normalize_string(value: str) -> str:
         return value.strip().lower()
 
 
+def encode_cursor(*values) -> str:
+    # Opaque keyset cursor: the sort values of the last row of a page
+    raw = json.dumps(list(values), default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _cursor_value(value, kind):
+    if kind is datetime:
+        if not isinstance(value, str):
+            raise TypeError("expected an ISO 8601 string")
+        return datetime.fromisoformat(value)
+    # bool is an int to isinstance, never a valid sort value
+    if isinstance(value, bool) or not isinstance(value, kind):
+        raise TypeError(f"unexpected {type(value).__name__}")
+    return value
+
+
+def decode_cursor(cursor: str, *kinds) -> list:
+    """The values of a cursor from encode_cursor, checked against kinds.
+
+    One kind per value: datetime parses an ISO 8601 string, a type or tuple of
+    types is checked with isinstance. A cursor of another shape is a 400.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(kinds):
+            raise ValueError("wrong number of values")
+        return [_cursor_value(value, kind) for value, kind in zip(values, kinds)]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
 def generate_password(suffix: str = "@cds", length: int = 4) -> str:
 
     digits = "".join(random.choices(string.digits, k=length))
@@ -34,33 +66,16 @@ def generate_password(suffix: str = "@cds", length: int = 4) -> str:
     return password
 
 
-async def send_email(
-    recipient_email: EmailStr, name: str, lname: str, Email: str, Password: str
+def send_email(
+    db, recipient_email: EmailStr, name: str, lname: str, Email: str, Password: str
 ):
-
-    sender_email = os.getenv("SENDER_EMAIL")
-    password = os.getenv("EMAIL_PASSWORD")
     subject = "User Details"
     body = f"Hi 'Mrs.{name} {lname}' \n Your Email_id: {Email} \n Your Password is:{Password} "
-    message = MIMEMultipart()
-    message["From"] = sender_email
-    message["To"] = recipient_email
-    message["Subject"] = subject
-    message.attach(MIMEText(body, "plain"))
-    try:
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            server.starttls()
-            server.login(sender_email, password)
-            server.sendmail(sender_email, recipient_email, message.as_string())
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to send OTP email: {str(e)}",
-            headers={"message": "OTP Send"},
-        )
-
-
-async def send_email_leave(
+    enqueue_email(db, recipient_email, subject, body)
+
+
+def send_email_leave(
+    db,
     recipient_email: EmailStr,
     name: str,
     lname: str,
@@ -69,27 +84,31 @@ async def send_email_leave(
     status: str,
     other_entires: list,
 ):
-
-    sender_email = os.getenv("SENDER_EMAIL")
-    password = os.getenv("EMAIL_PASSWORD")
     subject = "User Details"
     body = f"Hi 'Mrs. {name} {lname}' \n Your leave_id is: {Leave_id} \n Leave_status: {status} \n Your reason is: {reason} \n Other_entries: {other_entires}"
-    message = MIMEMultipart()
-    message["From"] = sender_email
-    message["To"] = recipient_email
-    message["Subject"] = subject
-    message.attach(MIMEText(body, "plain"))
-    try:
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            server.starttls()
-            server.login(sender_email, password)
-            server.sendmail(sender_email, recipient_email, message.as_string())
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to send OTP email: {str(e)}",
-            headers={"message": "OTP Send"},
-        )
+    enqueue_email(
+        db, recipient_email, subject, body, digest_key=f"leave:{recipient_email}"
+    )
+
+
+def send_email_leave_digest(
+    db,
+    recipient_email: EmailStr,
+    name: str,
+    lname: str,
+    leaves: list,
+):
+    subject = "Leave Status Update"
+    lines = [
+        f" Leave_id: {leave['leave']} | Date: {leave['date']} | Type: {leave['leave_type']} | Leave_status: {leave['status']} | Reason: {leave['reason']}"
+        for leave in leaves
+    ]
+    body = f"Hi 'Mrs. {name} {lname}' \n Your leave requests were updated: \n" + "\n".join(
+        lines
+    )
+    enqueue_email(
+        db, recipient_email, subject, body, digest_key=f"leave:{recipient_email}"
+    )
 
 
 def hash_password(password: str) -> str:
@@ -100,28 +119,13 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
-def send_email_with_pdf_attachment(recipient_email: str, pdf_stream: io.BytesIO):
-    # Create the email
-    try:
-        sender_email = os.getenv("SENDER_EMAIL")
-        password = os.getenv("EMAIL_PASSWORD")
-        msg = MIMEMultipart()
-        msg["From"] = sender_email  # Replace with your email
-        msg["To"] = "logger143@outlook.com"
-        msg["Subject"] = "Your Salary Slip"
-
-        # Attach the PDF to the email
-        pdf_stream.seek(0)  # Ensure you're at the beginning of the stream
-        pdf_attachment = MIMEApplication(pdf_stream.read(), Name="salary_slip.pdf")
-        pdf_attachment["Content-Disposition"] = 'attachment; filename="salary_slip.pdf"'
-        msg.attach(pdf_attachment)
-
-        # Send the email via SMTP
-        with smtplib.SMTP(
-            "smtp.gmail.com", 587
-        ) as server:  # Replace with your SMTP server and port
-            server.starttls()  # Secure the connection
-            server.login(sender_email, password)  # Replace with your email and password
-            server.send_message(msg)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+def send_email_with_pdf_attachment(db, recipient_email: str, pdf_stream: io.BytesIO):
+    pdf_stream.seek(0)  # Ensure you're at the beginning of the stream
+    enqueue_email(
+        db,
+        recipient_email,
+        "Your Salary Slip",
+        "",
+        attachment=pdf_stream.read(),
+        attachment_name="salary_slip.pdf",
+    )
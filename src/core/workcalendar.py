@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+
+from sqlalchemy import extract, or_
+from sqlalchemy.orm import Session
+
+from src.core.utils import normalize_string
+from src.models.holiday import Holiday
+
+# Saturday is 5, Sunday is 6
+WEEKEND_DAYS = (5, 6)
+# Longest range /holiday/working-days counts, each year is one query
+MAX_RANGE_YEARS = 5
+
+
+class WorkingDayCalendar:
+    """Working days per work location, precomputed one year at a time.
+
+    Each (location, year) is stored as a cumulative array where ``cum[i]`` is
+    the number of working days before day ``i`` of the year, so any range or
+    month count within a year is a difference of two entries. At most
+    max_entries of them are kept, least recently used dropped first.
+    """
+
+    def __init__(self, max_age: int = 3600, max_entries: int = 256):
+        # Holidays are edited through this process most of the time, the age
+        # limit picks up edits made by other workers
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._years = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cumulative(self, db: Session, location: str | None, year: int) -> list:
+        key = (normalize_string(location) or "", year)
+        with self._lock:
+            cached = self._years.get(key)
+            if cached and time.monotonic() - cached[0] < self.max_age:
+                self._years.move_to_end(key)
+                return cached[1]
+
+        location_filter = Holiday.work_location.is_(None)
+        if key[0]:
+            location_filter = or_(location_filter, Holiday.work_location == key[0])
+        holidays = {
+            holiday_date
+            for (holiday_date,) in db.query(Holiday.holiday_date).filter(
+                extract("year", Holiday.holiday_date) == year, location_filter
+            )
+        }
+
+        first = date(year, 1, 1)
+        days_in_year = (date(year + 1, 1, 1) - first).days
+        cumulative = [0] * (days_in_year + 1)
+        for i in range(days_in_year):
+            day = first + timedelta(days=i)
+            working = day.weekday() not in WEEKEND_DAYS and day not in holidays
+            cumulative[i + 1] = cumulative[i] + working
+
+        with self._lock:
+            self._years[key] = (time.monotonic(), cumulative)
+            self._years.move_to_end(key)
+            while len(self._years) > self.max_entries:
+                self._years.popitem(last=False)
+        return cumulative
+
+    def working_days_between(
+        self, db: Session, location: str | None, start: date, end: date
+    ) -> int:
+        # Inclusive on both ends, one lookup per calendar year spanned
+        if end < start:
+            return 0
+        total = 0
+        for year in range(start.year, end.year + 1):
+            cumulative = self._cumulative(db, location, year)
+            first = start if year == start.year else date(year, 1, 1)
+            last = end if year == end.year else date(year, 12, 31)
+            total += (
+                cumulative[last.timetuple().tm_yday]
+                - cumulative[first.timetuple().tm_yday - 1]
+            )
+        return total
+
+    def is_working_day(self, db: Session, location: str | None, day: date) -> bool:
+        return self.working_days_between(db, location, day, day) == 1
+
+    def working_days_in_month(
+        self, db: Session, location: str | None, year: int, month: int
+    ) -> int:
+        first = date(year, month, 1)
+        last = (first + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+        return self.working_days_between(db, location, first, last)
+
+    def invalidate(self, year: int | None = None):
+        with self._lock:
+            if year is None:
+                self._years.clear()
+            else:
+                for key in [key for key in self._years if key[1] == year]:
+                    del self._years[key]
+
+
+work_calendar = WorkingDayCalendar()
@@ -4,8 +4,11 @@ from fastapi import HTTPException, status
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from src.core.workcalendar import work_calendar
+from src.crud.leave import find_overlapping_leaves
+from src.crud.leave_summary import record_leave_change
 from src.models.employee import EmployeeEmploymentDetails
-from src.models.leave import EmployeeLeave, LeaveCalendar, LeaveDuration
+from src.models.leave import EmployeeLeave, LeaveCalendar, LeaveDuration, LeaveStatus
 from src.models.personal import EmployeeOnboarding
 from src.models.role import Role
 from src.schemas.leave import EmployeeLeaveCreate
@@ -109,12 +112,12 @@ def create_employee_leave_logic(
             detail=f"Employee '{employee_id}' not found",
         )
 
-    # Check if there is an existing leave entry on the same date for this employee
-    existing_leave = (
-        db.query(EmployeeLeave)
-        .filter(EmployeeLeave.employee_id == employee_data.id)
-        .filter(EmployeeLeave.start_date == leave.start_date)
-        .first()
+    # Check if an existing leave overlaps any day of the requested range
+    existing_leave = find_overlapping_leaves(
+        db,
+        employee_data.id,
+        leave.start_date,
+        leave.start_date + timedelta(days=leave.total_days - 1),
     )
     find_gender = (
         db.query(EmployeeOnboarding)
@@ -141,7 +144,7 @@ def create_employee_leave_logic(
     if existing_leave:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
-            detail="Leave entry already exists for the specified date .",
+            detail=f"Leave entry already exists for the specified date(s): {sorted(str(existing.start_date) for existing in existing_leave)}.",
         )
 
     def map_leave_duration(leave_duration_str: str):
@@ -158,10 +161,10 @@ def create_employee_leave_logic(
     print(leave.start_date.weekday())
     for i in range(leave.total_days):
         end_date = leave.start_date + timedelta(days=i)
-        if end_date.weekday() >= 5:  # Saturday is 5, Sunday is 6
+        if not work_calendar.is_working_day(db, employee_data.work_location, end_date):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Leave application cannot include weekends.",
+                detail="Leave application cannot include weekends or holidays.",
             )
         db_leave = EmployeeLeave(
             employee_id=employee_data.id,
@@ -174,6 +177,7 @@ def create_employee_leave_logic(
 
         leave_entries.append(db_leave)
         db.add(db_leave)
+        record_leave_change(db, db_leave, None, LeaveStatus.PENDING)
 
         # Call create_leave_balance and handle its return
         balance = create_leave_balance(db, employee_data.id, leave_type, leave_entries)
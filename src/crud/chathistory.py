@@ -1,36 +1,32 @@
-from datetime import datetime, timedelta
+import logging
+import os
+import threading
+import time
+from datetime import datetime
 from typing import List
 
 from fastapi import HTTPException, status
-from sqlalchemy import text
+from sqlalchemy import and_, func, or_
 from sqlalchemy.orm import Session
 
+from src.core.chat_search import chat_search
+from src.core.database import SessionLocal
+from src.core.utils import decode_cursor, encode_cursor
 from src.models.chathistory import ChatHistory
-from src.models.employee import EmployeeEmploymentDetails
 
+CHAT_RETENTION_BATCH = int(os.getenv("CHAT_RETENTION_BATCH", 1000))
+CHAT_RETENTION_PAUSE = float(os.getenv("CHAT_RETENTION_PAUSE", 0.2))
+# Bounds one run; what is left is picked up by the next run
+CHAT_RETENTION_MAX_BATCHES = int(os.getenv("CHAT_RETENTION_MAX_BATCHES", 500))
 
-def create_chat_message(db: Session, employee_id: int, question: str, response: str):
-    expiration_time = datetime.now() + timedelta(days=5)  # Set to expire in 30 days
-    employee = (
-        db.query(EmployeeEmploymentDetails)
-        .filter(EmployeeEmploymentDetails.employee_id == employee_id)
-        .first()
-    )
-    if not employee:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Employee '{employee_id}' is Not Found",
-        )
-    chat_message = ChatHistory(
-        employee_id=employee_id,
-        question=question,
-        response=response,
-        expiration_timestamp=expiration_time,
-    )
-    db.add(chat_message)
-    db.commit()
-    db.refresh(chat_message)
-    return chat_message
+retention_stats = {
+    "last_run_at": None,
+    "last_run_purged": 0,
+    "last_run_batches": 0,
+    "last_run_ms": None,
+    "lag_seconds": None,
+    "total_purged": 0,
+}
 
 
 from datetime import datetime
@@ -92,9 +88,160 @@ def get(db: Session, employee_id: int) -> List[dict]:
     return data
 
 
-def delete_expired_messages(db: Session):
-    db.execute(
-        text("DELETE FROM chat_history WHERE expiration_timestamp < NOW()"),
+def get_history_page(db: Session, employee_id: str, limit: int, cursor: str | None):
+    # Columns only, no ORM objects; timestamps are returned as datetimes and
+    # serialized to ISO 8601 by the response
+    query = db.query(
+        ChatHistory.id,
+        ChatHistory.question,
+        ChatHistory.response,
+        ChatHistory.timestamp,
+        ChatHistory.expiration_timestamp,
+    ).filter(ChatHistory.employee_id == employee_id)
+    if cursor:
+        timestamp, history_id = decode_cursor(cursor, datetime, int)
+        query = query.filter(
+            or_(
+                ChatHistory.timestamp < timestamp,
+                and_(ChatHistory.timestamp == timestamp, ChatHistory.id < history_id),
+            )
+        )
+    # Newest first, one extra row tells whether another page exists
+    rows = (
+        query.order_by(ChatHistory.timestamp.desc(), ChatHistory.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp.isoformat(), rows[-1].id)
+    return {
+        "next_cursor": next_cursor,
+        "history": [
+            {
+                "id": row.id,
+                "Question": row.question,
+                "Answer": row.response,
+                "History_create": row.timestamp,
+                "History_Expire": row.expiration_timestamp,
+            }
+            for row in rows
+        ],
+    }
+
+
+def purge_expired_messages(
+    batch_size: int = CHAT_RETENTION_BATCH,
+    pause: float = CHAT_RETENTION_PAUSE,
+    max_batches: int = CHAT_RETENTION_MAX_BATCHES,
+):
+    # Scheduler job. Each batch uses its own short session and transaction so
+    # locks are held for one batch only, with a pause between batches.
+    started = time.perf_counter()
+    purged = 0
+    batches = 0
+    while batches < max_batches:
+        db = SessionLocal()
+        try:
+            now = datetime.now()
+            ids = [
+                history_id
+                for (history_id,) in db.query(ChatHistory.id)
+                .filter(ChatHistory.expiration_timestamp < now)
+                .order_by(ChatHistory.expiration_timestamp)
+                .limit(batch_size)
+            ]
+            if ids:
+                db.query(ChatHistory).filter(ChatHistory.id.in_(ids)).delete(
+                    synchronize_session=False
+                )
+                db.commit()
+        finally:
+            db.close()
+        purged += len(ids)
+        batches += 1
+        if len(ids) < batch_size:
+            break
+        time.sleep(pause)
+
+    try:
+        chat_search.delete_expired(datetime.now())
+    except Exception as e:
+        logging.error(f"Chat search index purge failed: {e}")
+
+    db = SessionLocal()
+    try:
+        oldest = (
+            db.query(func.min(ChatHistory.expiration_timestamp))
+            .filter(ChatHistory.expiration_timestamp < datetime.now())
+            .scalar()
+        )
+    finally:
+        db.close()
+    retention_stats.update(
+        {
+            "last_run_at": datetime.now(),
+            "last_run_purged": purged,
+            "last_run_batches": batches,
+            "last_run_ms": round((time.perf_counter() - started) * 1000, 2),
+            # How far behind the purge is: age of the oldest expired row left
+            "lag_seconds": (
+                (datetime.now() - oldest).total_seconds() if oldest else 0
+            ),
+        }
     )
-    print("delete")
-    db.commit()
+    retention_stats["total_purged"] += purged
+    return dict(retention_stats)
+
+
+def rebuild_chat_search(last_id: int | None = None, chunk_size: int = 5000) -> int:
+    # Indexes chat_history up to last_id, all of it when None, in id order
+    db = SessionLocal()
+    try:
+        indexed = 0
+        after_id = 0
+        while True:
+            query = db.query(
+                ChatHistory.id,
+                ChatHistory.employee_id,
+                ChatHistory.question,
+                ChatHistory.response,
+                ChatHistory.timestamp,
+                ChatHistory.expiration_timestamp,
+            ).filter(ChatHistory.id > after_id)
+            if last_id is not None:
+                query = query.filter(ChatHistory.id <= last_id)
+            rows = query.order_by(ChatHistory.id).limit(chunk_size).all()
+            if not rows:
+                break
+            chat_search.add_many(row._mapping for row in rows)
+            indexed += len(rows)
+            after_id = rows[-1].id
+    finally:
+        db.close()
+    return indexed
+
+
+def start_chat_search_rebuild():
+    # The index file does not survive a restart on an ephemeral disk. Called
+    # before the ingest buffer starts: rows up to the current last id are
+    # indexed here in the background, every later one by the ingest flusher.
+    if not chat_search.is_empty():
+        return
+    db = SessionLocal()
+    try:
+        last_id = db.query(func.max(ChatHistory.id)).scalar()
+    finally:
+        db.close()
+    if last_id is None:
+        return
+
+    def rebuild():
+        try:
+            indexed = rebuild_chat_search(last_id)
+            logging.info(f"Indexed {indexed} chat messages into {chat_search.path}")
+        except Exception as e:
+            logging.error(f"Chat search index rebuild failed: {e}")
+
+    threading.Thread(target=rebuild, daemon=True).start()
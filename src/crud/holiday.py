@@ -0,0 +1,63 @@
+from fastapi import HTTPException, status
+from sqlalchemy import extract
+from sqlalchemy.orm import Session
+
+from src.core.utils import normalize_string
+from src.core.workcalendar import work_calendar
+from src.models.holiday import Holiday
+from src.schemas.holiday import HolidayCreate
+
+
+def create_holiday(db: Session, holiday: HolidayCreate):
+    work_location = normalize_string(holiday.work_location) or None
+    existing = (
+        db.query(Holiday)
+        .filter(
+            Holiday.holiday_date == holiday.holiday_date,
+            (
+                Holiday.work_location == work_location
+                if work_location
+                else Holiday.work_location.is_(None)
+            ),
+        )
+        .first()
+    )
+    if existing:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Holiday already exists on {holiday.holiday_date} for '{work_location or 'all locations'}'",
+        )
+    db_holiday = Holiday(
+        name=holiday.name,
+        holiday_date=holiday.holiday_date,
+        work_location=work_location,
+    )
+    db.add(db_holiday)
+    db.commit()
+    db.refresh(db_holiday)
+    work_calendar.invalidate(db_holiday.holiday_date.year)
+    return db_holiday
+
+
+def get_holidays(db: Session, year: int, work_location: str | None = None):
+    query = db.query(Holiday).filter(extract("year", Holiday.holiday_date) == year)
+    if work_location:
+        query = query.filter(
+            (Holiday.work_location == normalize_string(work_location))
+            | Holiday.work_location.is_(None)
+        )
+    return query.order_by(Holiday.holiday_date).all()
+
+
+def delete_holiday(db: Session, holiday_id: int):
+    db_holiday = db.query(Holiday).filter(Holiday.id == holiday_id).first()
+    if not db_holiday:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Holiday id: '{holiday_id}' is not found",
+        )
+    year = db_holiday.holiday_date.year
+    db.delete(db_holiday)
+    db.commit()
+    work_calendar.invalidate(year)
+    return {"details": f"Holiday id: '{holiday_id}' deleted successfully"}
@@ -1,12 +1,20 @@
-from datetime import timedelta
+import calendar
+from collections import defaultdict
+from datetime import date, datetime, timedelta
 
 from fastapi import HTTPException, status
-from sqlalchemy import extract
+from sqlalchemy import and_, extract, or_
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy.sql import func
 
-from src.core.utils import normalize_string, send_email_leave
+from src.core.utils import (
+    decode_cursor,
+    encode_cursor,
+    normalize_string,
+    send_email_leave,
+)
+from src.crud.leave_summary import record_leave_change
 from src.models.association import employee_role
 from src.models.employee import EmployeeEmploymentDetails
 from src.models.leave import EmployeeLeave, LeaveCalendar, LeaveDuration, LeaveStatus
@@ -17,6 +25,14 @@ from src.schemas.leave import (
     LeaveCalendarUpdate,
 )
 
+# Leave type -> LeaveCalendar balance column
+LEAVE_BALANCE_FIELDS = {
+    "sick": "sick_leave",
+    "personal": "personal_leave",
+    "vacation": "vacation_leave",
+    "unpaid": "unpaid_leave",
+}
+
 
 def adjust_leave_balance(
     db: Session,
@@ -224,6 +240,7 @@ def create_employee_leave(db: Session, leave: EmployeeLeaveCreate, employee_id:
 
         leave_entries.append(db_leave)
         db.add(db_leave)
+        record_leave_change(db, db_leave, None, LeaveStatus.PENDING)
 
         # Call create_leave_balance and handle its return
         balance = create_leave_balance(db, employee_data.id, leave_type, leave_entries)
@@ -477,6 +494,178 @@ def get_leave_by_report_manager(db: Session, report_manager_id: str):
     return leave_details
 
 
+def get_pending_leave_queue(
+    db: Session,
+    report_manager: str | None = None,
+    leave_type: str | None = None,
+    start_from: date | None = None,
+    start_to: date | None = None,
+    limit: int = 20,
+    cursor: str | None = None,
+):
+    # Filters shared by the page query and the count query
+    filters = [EmployeeLeave.status == LeaveStatus.PENDING]
+    if report_manager:
+        filters.append(EmployeeEmploymentDetails.reporting_manager == report_manager)
+    if leave_type:
+        filters.append(EmployeeLeave.leave_type == leave_type)
+    if start_from:
+        filters.append(EmployeeLeave.start_date >= start_from)
+    if start_to:
+        filters.append(EmployeeLeave.start_date <= start_to)
+
+    page_query = (
+        db.query(
+            EmployeeLeave.id,
+            EmployeeEmploymentDetails.employee_id,
+            EmployeeLeave.leave_type,
+            EmployeeLeave.duration,
+            EmployeeLeave.start_date,
+            EmployeeLeave.reason,
+            EmployeeLeave.created_at,
+        )
+        .join(
+            EmployeeEmploymentDetails,
+            EmployeeEmploymentDetails.id == EmployeeLeave.employee_id,
+        )
+        .filter(*filters)
+    )
+    if cursor:
+        created_at, leave_id = decode_cursor(cursor, datetime, int)
+        page_query = page_query.filter(
+            or_(
+                EmployeeLeave.created_at > created_at,
+                and_(
+                    EmployeeLeave.created_at == created_at,
+                    EmployeeLeave.id > leave_id,
+                ),
+            )
+        )
+    # Oldest request first, one extra row tells whether another page exists
+    rows = (
+        page_query.order_by(EmployeeLeave.created_at, EmployeeLeave.id)
+        .limit(limit + 1)
+        .all()
+    )
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at.isoformat(), rows[-1].id)
+
+    counts = (
+        db.query(EmployeeLeave.leave_type, func.count(EmployeeLeave.id))
+        .join(
+            EmployeeEmploymentDetails,
+            EmployeeEmploymentDetails.id == EmployeeLeave.employee_id,
+        )
+        .filter(*filters)
+        .group_by(EmployeeLeave.leave_type)
+        .all()
+    )
+    by_type = {leave_type: count for leave_type, count in counts}
+
+    return {
+        "total": sum(by_type.values()),
+        "count_by_type": by_type,
+        "next_cursor": next_cursor,
+        "leaves": [
+            {
+                "leave_id": row.id,
+                "employee_id": row.employee_id,
+                "leave_type": row.leave_type,
+                "duration": row.duration.value,
+                "date": row.start_date,
+                "Reason": row.reason,
+                "created_at": row.created_at,
+            }
+            for row in rows
+        ],
+    }
+
+
+def find_overlapping_leaves(db: Session, employee_id: int, start: date, end: date):
+    # Range predicate served by ix_employee_leaves_employee_range, rejected
+    # leaves do not block a new application
+    return (
+        db.query(EmployeeLeave)
+        .filter(
+            EmployeeLeave.employee_id == employee_id,
+            EmployeeLeave.status != LeaveStatus.REJECTED,
+            EmployeeLeave.start_date <= end,
+            EmployeeLeave.end_date >= start,
+        )
+        .all()
+    )
+
+
+def get_team_availability(db: Session, report_manager: str, year: int, month: int):
+    days_in_month = calendar.monthrange(year, month)[1]
+    month_start = date(year, month, 1)
+    month_end = date(year, month, days_in_month)
+
+    team_size = (
+        db.query(func.count(EmployeeEmploymentDetails.id))
+        .filter(
+            EmployeeEmploymentDetails.reporting_manager == report_manager,
+            EmployeeEmploymentDetails.is_active == True,  # noqa: E712
+        )
+        .scalar()
+    )
+    if not team_size:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No employees found for this reporting manager",
+        )
+
+    leaves = (
+        db.query(
+            EmployeeLeave.start_date,
+            EmployeeLeave.end_date,
+            EmployeeLeave.duration,
+            EmployeeLeave.status,
+        )
+        .join(
+            EmployeeEmploymentDetails,
+            EmployeeEmploymentDetails.id == EmployeeLeave.employee_id,
+        )
+        .filter(
+            EmployeeEmploymentDetails.reporting_manager == report_manager,
+            EmployeeEmploymentDetails.is_active == True,  # noqa: E712
+            EmployeeLeave.status != LeaveStatus.REJECTED,
+            EmployeeLeave.start_date <= month_end,
+            EmployeeLeave.end_date >= month_start,
+        )
+        .all()
+    )
+
+    # Difference arrays over the days of the month: +weight on the first day
+    # of a leave, -weight after its last day, then one prefix sum
+    approved = [0.0] * (days_in_month + 2)
+    pending = [0.0] * (days_in_month + 2)
+    for start_date, end_date, duration, leave_status in leaves:
+        weight = 1 if duration == LeaveDuration.ONE_DAY else 0.5
+        first = max(start_date, month_start).day
+        last = min(end_date, month_end).day
+        counts = approved if leave_status == LeaveStatus.APPROVED else pending
+        counts[first] += weight
+        counts[last + 1] -= weight
+
+    heatmap = []
+    approved_out = pending_out = 0.0
+    for day in range(1, days_in_month + 1):
+        approved_out += approved[day]
+        pending_out += pending[day]
+        heatmap.append(
+            {
+                "date": date(year, month, day),
+                "on_leave": approved_out,
+                "pending": pending_out,
+                "available": team_size - approved_out,
+            }
+        )
+    return {"team_size": team_size, "days": heatmap}
+
+
 def update_employee_leave(db: Session, leave_update: EmployeeLeaveUpdate):
     # Query to find the leave request of the employee
     db_leave = (
@@ -506,6 +695,7 @@ def update_employee_leave(db: Session, leave_update: EmployeeLeaveUpdate):
 
     # If leave request found, update the details
     if db_leave:
+        old_status = db_leave.status
         if leave_update.status == LeaveStatus.APPROVED.value:
             db_leave.status = LeaveStatus.APPROVED
             if leave_update.reason:
@@ -515,6 +705,7 @@ def update_employee_leave(db: Session, leave_update: EmployeeLeaveUpdate):
         if leave_update.reason and leave_update.status == LeaveStatus.REJECTED.value:
             db_leave.status = LeaveStatus.REJECTED
             db_leave.reject_reason = leave_update.reason
+        record_leave_change(db, db_leave, old_status, db_leave.status)
         leave_type = normalize_string(db_leave.leave_type)
         duration = db_leave.duration.value
         adjust_leave_balance(
@@ -578,6 +769,7 @@ def update_employee_teamlead(
 
     # If leave request found, update the details
     if db_leave:
+        old_status = db_leave.status
         if leave_update.status == LeaveStatus.APPROVED.value:
             db_leave.status = LeaveStatus.APPROVED
             if leave_update.reason:
@@ -588,6 +780,7 @@ def update_employee_teamlead(
         if leave_update.reason and leave_update.status == LeaveStatus.REJECTED.value:
             db_leave.status = LeaveStatus.REJECTED
             db_leave.reject_reason = leave_update.reason
+        record_leave_change(db, db_leave, old_status, db_leave.status)
         leave_type = normalize_string(db_leave.leave_type)
         duration = db_leave.duration.value
         adjust_leave_balance(
@@ -620,6 +813,156 @@ def update_employee_teamlead(
     }
 
 
+def bulk_update_employee_leaves(
+    db: Session, leave_updates: list, report_manager: str | None = None
+):
+    # One decision per leave id, the last one wins if a leave is sent twice
+    decisions = {update.leave_id: update for update in leave_updates}
+    for update in decisions.values():
+        if update.status == LeaveStatus.PENDING.value:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid leave status provided 'Pending' for leave id:{update.leave_id}",
+            )
+        if update.status == LeaveStatus.REJECTED.value and (
+            not update.reason or not update.reason.strip()
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Please provide a reason for rejecting the leave id:{update.leave_id}",
+            )
+
+    # Lock every leave in the batch, ordered by id to avoid deadlocks between
+    # concurrent bulk decisions
+    leaves = (
+        db.query(EmployeeLeave)
+        .filter(EmployeeLeave.id.in_(decisions.keys()))
+        .order_by(EmployeeLeave.id)
+        .with_for_update()
+        .all()
+    )
+    missing = sorted(set(decisions) - {leave.id for leave in leaves})
+    if missing:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Leave not found for leave id(s):{missing}",
+        )
+    not_pending = [leave.id for leave in leaves if leave.status != LeaveStatus.PENDING]
+    if not_pending:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Leave id(s):{not_pending} are already approved or rejected",
+        )
+
+    employee_query = (
+        db.query(EmployeeEmploymentDetails)
+        .options(joinedload(EmployeeEmploymentDetails.employee))
+        .filter(
+            EmployeeEmploymentDetails.id.in_({leave.employee_id for leave in leaves})
+        )
+    )
+    if report_manager:
+        employee_query = employee_query.filter(
+            EmployeeEmploymentDetails.reporting_manager == report_manager
+        )
+    employees = {employee.id: employee for employee in employee_query.all()}
+    forbidden = [leave.id for leave in leaves if leave.employee_id not in employees]
+    if forbidden:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Employee not found or not authenticated to access leave id(s):{forbidden}",
+        )
+
+    # Apply the decisions and sum the approved days per (employee, balance)
+    debits = defaultdict(float)
+    for leave in leaves:
+        decision = decisions[leave.id]
+        record_leave_change(
+            db, leave, LeaveStatus.PENDING, LeaveStatus(decision.status)
+        )
+        if decision.status == LeaveStatus.APPROVED.value:
+            leave_type = normalize_string(leave.leave_type)
+            if leave_type not in LEAVE_BALANCE_FIELDS:
+                db.rollback()
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Invalid leave type '{leave.leave_type}' for leave id:{leave.id}",
+                )
+            days = 1 if leave.duration == LeaveDuration.ONE_DAY else 0.5
+            debits[(leave.employee_id, LEAVE_BALANCE_FIELDS[leave_type])] += days
+            leave.status = LeaveStatus.APPROVED
+            leave.reject_reason = decision.reason or "Leave Granted"
+        else:
+            leave.status = LeaveStatus.REJECTED
+            leave.reject_reason = decision.reason
+
+    calendars = {
+        calendar.employee_id: calendar
+        for calendar in db.query(LeaveCalendar)
+        .filter(LeaveCalendar.employee_id.in_({key[0] for key in debits}))
+        .order_by(LeaveCalendar.employee_id)
+        .with_for_update()
+        .all()
+    }
+    for (employee_id, field_name), days in debits.items():
+        leave_calendar = calendars.get(employee_id)
+        if not leave_calendar:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"LeaveCalendar entry not found for the specified employee {employees[employee_id].employee_id}.",
+            )
+        current_balance = getattr(leave_calendar, field_name) or 0
+        # Unpaid leave has no quota, it only counts the days taken
+        if field_name == "unpaid_leave":
+            setattr(leave_calendar, field_name, current_balance + days)
+        elif current_balance >= days:
+            setattr(leave_calendar, field_name, current_balance - days)
+        else:
+            db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Employee {employees[employee_id].employee_id} has only {current_balance} {field_name.replace('_', ' ')} left, {days} day(s) requested for approval.",
+            )
+
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while updating the leave requests.",
+        )
+
+    # One digest per employee
+    digests = {}
+    for leave in leaves:
+        employee_data = employees[leave.employee_id]
+        digest = digests.setdefault(
+            employee_data.id,
+            {
+                "employee_email": employee_data.employee_email,
+                "employee_code": employee_data.employee_id,
+                "employee_firstname": employee_data.employee.firstname,
+                "employee_lastname": employee_data.employee.lastname,
+                "leaves": [],
+            },
+        )
+        digest["leaves"].append(
+            {
+                "leave": leave.id,
+                "leave_type": leave.leave_type,
+                "date": leave.start_date,
+                "status": leave.status.value,
+                "reason": leave.reject_reason,
+            }
+        )
+    return list(digests.values())
+
+
 # Delete a leave
 def delete_employee_leave(db: Session, employee_id: str, leave_id: int):
     db_leave = (
@@ -636,6 +979,7 @@ def delete_employee_leave(db: Session, employee_id: str, leave_id: int):
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f" No pending Leave  in leave id : '{leave_id}' ",
         )
+    record_leave_change(db, db_leave, db_leave.status, None)
     db.delete(db_leave)
     db.commit()
     return db_leave
@@ -0,0 +1,258 @@
+import logging
+from collections import defaultdict
+from datetime import date
+
+from fastapi import HTTPException, status
+from sqlalchemy import case, extract, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.core.database import SessionLocal
+from src.core.utils import normalize_string
+from src.models.employee import EmployeeEmploymentDetails
+from src.models.leave import (
+    EmployeeLeave,
+    LeaveDuration,
+    LeaveStatus,
+    LeaveSummary,
+    LeaveSummaryState,
+)
+
+# Counter column of a summary row for each leave status
+STATUS_FIELDS = {
+    LeaveStatus.APPROVED: "approved_days",
+    LeaveStatus.PENDING: "pending_count",
+    LeaveStatus.REJECTED: "rejected_count",
+}
+
+
+def leave_days(duration) -> float:
+    return 1 if duration in (LeaveDuration.ONE_DAY, "oneday") else 0.5
+
+
+def _summary_row(db: Session, employee_id: int, leave_type: str, day: date):
+    query = db.query(LeaveSummary).filter(
+        LeaveSummary.employee_id == employee_id,
+        LeaveSummary.leave_type == leave_type,
+        LeaveSummary.year == day.year,
+        LeaveSummary.month == day.month,
+    )
+    row = query.with_for_update().first()
+    if row:
+        return row
+    row = LeaveSummary(
+        employee_id=employee_id,
+        leave_type=leave_type,
+        year=day.year,
+        month=day.month,
+        approved_days=0.0,
+        pending_count=0,
+        rejected_count=0,
+    )
+    try:
+        # Flushed in a savepoint, so the next leave of the same month finds
+        # this row, and a duplicate from a concurrent approval only undoes it
+        with db.begin_nested():
+            db.add(row)
+    except IntegrityError:
+        row = query.with_for_update().one()
+    return row
+
+
+def record_leave_change(
+    db: Session,
+    leave: EmployeeLeave,
+    old_status: LeaveStatus | None,
+    new_status: LeaveStatus | None,
+):
+    # Moves one leave between the counters of its summary row. Creation has no
+    # old status, deletion no new one. The caller commits, so the summary is
+    # written in the same transaction as the leave itself.
+    if old_status == new_status:
+        return
+    row = _summary_row(
+        db, leave.employee_id, normalize_string(leave.leave_type), leave.start_date
+    )
+    for leave_status, sign in ((old_status, -1), (new_status, 1)):
+        if leave_status is None:
+            continue
+        field_name = STATUS_FIELDS[LeaveStatus(leave_status)]
+        step = leave_days(leave.duration) if field_name == "approved_days" else 1
+        setattr(row, field_name, (getattr(row, field_name) or 0) + sign * step)
+
+
+def get_leave_summary(db: Session, employee_id: str, year: int, month: int):
+    employee_data = (
+        db.query(EmployeeEmploymentDetails.id)
+        .filter(EmployeeEmploymentDetails.employee_id == employee_id)
+        .first()
+    )
+    if not employee_data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Employee '{employee_id}' not found.",
+        )
+    rows = (
+        db.query(LeaveSummary)
+        .filter(
+            LeaveSummary.employee_id == employee_data.id, LeaveSummary.year == year
+        )
+        .all()
+    )
+    taken = defaultdict(float)
+    pending = 0
+    unpaid_this_month = 0.0
+    for row in rows:
+        taken[row.leave_type] += row.approved_days
+        pending += row.pending_count
+        if row.month == month and row.leave_type == "unpaid":
+            unpaid_this_month = row.approved_days
+    return {
+        "employee_id": employee_id,
+        "year": year,
+        "month": month,
+        "taken_by_type": dict(taken),
+        "pending_count": pending,
+        "unpaid_days_this_month": unpaid_this_month,
+    }
+
+
+def unpaid_leave_days(db: Session, year: int, month: int):
+    # Approved unpaid days per employee for the month. Slips and payroll runs
+    # both read them here, so a slip and its payroll item always agree.
+    return db.query(
+        LeaveSummary.employee_id, LeaveSummary.approved_days.label("unpaid_days")
+    ).filter(
+        LeaveSummary.leave_type == "unpaid",
+        LeaveSummary.year == year,
+        LeaveSummary.month == month,
+    )
+
+
+def get_unpaid_leave_days(db: Session, employee_id: int, year: int, month: int):
+    row = (
+        unpaid_leave_days(db, year, month)
+        .filter(LeaveSummary.employee_id == employee_id)
+        .first()
+    )
+    return row.unpaid_days if row else 0.0
+
+
+def _expected_summary(db: Session, employee_id: int | None = None):
+    # Recomputes the projection from employee_leaves in one grouped scan
+    leave_type = func.lower(func.trim(EmployeeLeave.leave_type))
+    year = extract("year", EmployeeLeave.start_date)
+    month = extract("month", EmployeeLeave.start_date)
+    days = case((EmployeeLeave.duration == LeaveDuration.ONE_DAY, 1.0), else_=0.5)
+    query = db.query(
+        EmployeeLeave.employee_id,
+        leave_type,
+        year,
+        month,
+        func.sum(case((EmployeeLeave.status == LeaveStatus.APPROVED, days), else_=0)),
+        func.sum(case((EmployeeLeave.status == LeaveStatus.PENDING, 1), else_=0)),
+        func.sum(case((EmployeeLeave.status == LeaveStatus.REJECTED, 1), else_=0)),
+    )
+    if employee_id is not None:
+        query = query.filter(EmployeeLeave.employee_id == employee_id)
+    rows = query.group_by(EmployeeLeave.employee_id, leave_type, year, month).all()
+    return {
+        (emp_id, l_type, int(y), int(m)): (
+            float(approved or 0),
+            int(p or 0),
+            int(r or 0),
+        )
+        for emp_id, l_type, y, m, approved, p, r in rows
+    }
+
+
+def rebuild_leave_summary(db: Session, employee_id: int | None = None):
+    expected = _expected_summary(db, employee_id)
+    delete_query = db.query(LeaveSummary)
+    if employee_id is not None:
+        delete_query = delete_query.filter(LeaveSummary.employee_id == employee_id)
+    delete_query.delete(synchronize_session=False)
+    db.bulk_insert_mappings(
+        LeaveSummary,
+        [
+            {
+                "employee_id": emp_id,
+                "leave_type": leave_type,
+                "year": year,
+                "month": month,
+                "approved_days": approved,
+                "pending_count": pending,
+                "rejected_count": rejected,
+            }
+            for (emp_id, leave_type, year, month), (
+                approved,
+                pending,
+                rejected,
+            ) in expected.items()
+        ],
+    )
+    if employee_id is None:
+        db.merge(LeaveSummaryState(id=1, rebuilt_at=func.now()))
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An error occurred while rebuilding the leave summary.",
+        )
+    return {"detail": f"Leave summary rebuilt with {len(expected)} rows"}
+
+
+def ensure_leave_summary():
+    # Runs at startup: the first deploy with leave_summary fills it from
+    # employee_leaves, every later one finds the marker and returns
+    db = SessionLocal()
+    try:
+        if db.get(LeaveSummaryState, 1):
+            return
+        try:
+            # Claimed in the rebuild's transaction, a concurrent worker blocks
+            # on the key until it commits and then backs off
+            db.add(LeaveSummaryState(id=1))
+            db.flush()
+        except IntegrityError:
+            db.rollback()
+            return
+        logging.info(rebuild_leave_summary(db)["detail"])
+    finally:
+        db.close()
+
+
+def check_leave_summary(db: Session, employee_id: int | None = None):
+    expected = _expected_summary(db, employee_id)
+    query = db.query(LeaveSummary)
+    if employee_id is not None:
+        query = query.filter(LeaveSummary.employee_id == employee_id)
+    actual = {
+        (row.employee_id, row.leave_type, row.year, row.month): (
+            float(row.approved_days),
+            row.pending_count,
+            row.rejected_count,
+        )
+        for row in query.all()
+    }
+    counters = ("approved_days", "pending", "rejected")
+    mismatches = []
+    for key in sorted(set(expected) | set(actual), key=str):
+        # Rows emptied by deletes are kept at zero, which matches no row at all
+        want = expected.get(key, (0.0, 0, 0))
+        have = actual.get(key, (0.0, 0, 0))
+        if want != have:
+            emp_id, leave_type, year, month = key
+            mismatches.append(
+                {
+                    "employee_id": emp_id,
+                    "leave_type": leave_type,
+                    "year": year,
+                    "month": month,
+                    "expected": dict(zip(counters, want)),
+                    "actual": dict(zip(counters, have)),
+                }
+            )
+    return {"consistent": not mismatches, "mismatches": mismatches}
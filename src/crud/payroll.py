@@ -0,0 +1,287 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from fastapi import HTTPException, status
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from src.core.database import SessionLocal
+from src.core.salary_slip import (
+    compute_net_pay,
+    compute_salary_slip,
+    iter_zip,
+    render_salary_slip,
+    render_salary_slips,
+)
+from src.core.workcalendar import work_calendar
+from src.crud.leave_summary import unpaid_leave_days
+from src.models.employee import EmployeeEmploymentDetails
+from src.models.payroll import (
+    PayrollItemStatus,
+    PayrollRun,
+    PayrollRunItem,
+    PayrollRunStatus,
+)
+from src.models.personal import EmployeeOnboarding
+
+PAYROLL_CHUNK_SIZE = int(os.getenv("PAYROLL_CHUNK_SIZE", 50))
+PAYROLL_WORKERS = int(os.getenv("PAYROLL_WORKERS", os.cpu_count() or 2))
+
+# Runs being processed by this process, a second resume must not race them
+_active_runs = set()
+_active_runs_lock = threading.Lock()
+
+
+def _items_with_employees(db: Session, run_id: int):
+    return (
+        db.query(
+            PayrollRunItem, EmployeeEmploymentDetails, EmployeeOnboarding.firstname
+        )
+        .join(
+            EmployeeEmploymentDetails,
+            EmployeeEmploymentDetails.id == PayrollRunItem.employee_id,
+        )
+        .join(
+            EmployeeOnboarding,
+            EmployeeOnboarding.employment_id == EmployeeEmploymentDetails.employee_id,
+        )
+        .filter(PayrollRunItem.run_id == run_id)
+    )
+
+
+def _item_slip(item, employee, firstname, pay_period) -> dict:
+    # Slips are computed from the snapshot of the run, not the current salary
+    return compute_salary_slip(
+        item.basic_salary,
+        item.working_days,
+        item.unpaid_days,
+        date_of_joining=employee.start_date,
+        pay_period=pay_period,
+        employee_name=firstname,
+        designation=employee.job_position,
+        department=employee.department,
+    )
+
+
+def create_payroll_run(db: Session, year: int, month: int):
+    run = (
+        db.query(PayrollRun)
+        .filter(PayrollRun.year == year, PayrollRun.month == month)
+        .first()
+    )
+    if run:
+        return run
+
+    run = PayrollRun(year=year, month=month, status=PayrollRunStatus.PENDING)
+    db.add(run)
+    db.flush()
+
+    # Every active employee with their approved unpaid days of the month in
+    # one query, from the same source as a single salary slip
+    unpaid = unpaid_leave_days(db, year, month).subquery()
+    rows = (
+        db.query(
+            EmployeeEmploymentDetails.id,
+            EmployeeEmploymentDetails.basic_salary,
+            EmployeeEmploymentDetails.work_location,
+            func.coalesce(unpaid.c.unpaid_days, 0),
+        )
+        .outerjoin(unpaid, unpaid.c.employee_id == EmployeeEmploymentDetails.id)
+        .filter(EmployeeEmploymentDetails.is_active == True)  # noqa: E712
+        .all()
+    )
+    working_days = {}
+    items = []
+    for employee_id, basic_salary, work_location, unpaid_days in rows:
+        if work_location not in working_days:
+            working_days[work_location] = work_calendar.working_days_in_month(
+                db, work_location, year, month
+            )
+        days = working_days[work_location]
+        items.append(
+            {
+                "run_id": run.id,
+                "employee_id": employee_id,
+                "status": PayrollItemStatus.PENDING,
+                "basic_salary": basic_salary,
+                "working_days": days,
+                "unpaid_days": unpaid_days,
+                "net_pay": round(compute_net_pay(basic_salary, days, unpaid_days), 2),
+            }
+        )
+    db.bulk_insert_mappings(PayrollRunItem, items)
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An error occurred while creating the payroll run {month}/{year}.",
+        )
+    db.refresh(run)
+    return run
+
+
+def process_payroll_run(run_id: int):
+    # Runs in the background with its own session. Items are committed chunk
+    # by chunk, so after a crash only the unfinished chunk is rendered again.
+    with _active_runs_lock:
+        if run_id in _active_runs:
+            return
+        _active_runs.add(run_id)
+    db = SessionLocal()
+    run = None
+    try:
+        run = db.query(PayrollRun).filter(PayrollRun.id == run_id).first()
+        if not run:
+            return
+        run.status = PayrollRunStatus.RUNNING
+        db.commit()
+        pay_period = date(run.year, run.month, 1)
+
+        last_id = 0
+        with ProcessPoolExecutor(max_workers=PAYROLL_WORKERS) as pool:
+            while True:
+                chunk = (
+                    _items_with_employees(db, run_id)
+                    .filter(
+                        PayrollRunItem.status != PayrollItemStatus.RENDERED,
+                        PayrollRunItem.id > last_id,
+                    )
+                    .order_by(PayrollRunItem.id)
+                    .limit(PAYROLL_CHUNK_SIZE)
+                    .all()
+                )
+                if not chunk:
+                    break
+                # Bad data of one employee fails their item, not the chunk
+                rendering = []
+                for item, employee, firstname in chunk:
+                    try:
+                        slip = _item_slip(item, employee, firstname, pay_period)
+                        rendering.append((item, pool.submit(render_salary_slip, slip)))
+                    except Exception as e:
+                        item.status = PayrollItemStatus.FAILED
+                        item.error = str(e)
+                for item, future in rendering:
+                    try:
+                        item.pdf = future.result()
+                        item.status = PayrollItemStatus.RENDERED
+                        item.error = None
+                    except Exception as e:
+                        item.status = PayrollItemStatus.FAILED
+                        item.error = str(e)
+                db.commit()
+                last_id = chunk[-1][0].id
+    finally:
+        try:
+            if run is not None:
+                # Also after a crash, so the run is never left RUNNING; items
+                # not rendered yet make it FAILED and a resume picks them up
+                db.rollback()
+                failed = (
+                    db.query(func.count(PayrollRunItem.id))
+                    .filter(
+                        PayrollRunItem.run_id == run_id,
+                        PayrollRunItem.status != PayrollItemStatus.RENDERED,
+                    )
+                    .scalar()
+                )
+                run.status = (
+                    PayrollRunStatus.FAILED if failed else PayrollRunStatus.COMPLETED
+                )
+                db.commit()
+        finally:
+            db.close()
+            with _active_runs_lock:
+                _active_runs.discard(run_id)
+
+
+def is_payroll_run_active(run_id: int) -> bool:
+    return run_id in _active_runs
+
+
+def get_payroll_run(db: Session, run_id: int):
+    run = db.query(PayrollRun).filter(PayrollRun.id == run_id).first()
+    if not run:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Payroll run id: '{run_id}' not found",
+        )
+    counts = dict(
+        db.query(PayrollRunItem.status, func.count(PayrollRunItem.id))
+        .filter(PayrollRunItem.run_id == run_id)
+        .group_by(PayrollRunItem.status)
+        .all()
+    )
+    failures = (
+        db.query(PayrollRunItem.employee_id, PayrollRunItem.error)
+        .filter(
+            PayrollRunItem.run_id == run_id,
+            PayrollRunItem.status == PayrollItemStatus.FAILED,
+        )
+        .limit(50)
+        .all()
+    )
+    return {
+        "run_id": run.id,
+        "year": run.year,
+        "month": run.month,
+        "status": run.status.value,
+        "total": sum(counts.values()),
+        "items": {item_status.value: count for item_status, count in counts.items()},
+        "failures": [
+            {"employee_id": employee_id, "error": error}
+            for employee_id, error in failures
+        ],
+    }
+
+
+def _iter_run_items(db: Session, run_id: int):
+    last_id = 0
+    while True:
+        chunk = (
+            _items_with_employees(db, run_id)
+            .filter(PayrollRunItem.id > last_id)
+            .order_by(PayrollRunItem.id)
+            .limit(PAYROLL_CHUNK_SIZE)
+            .all()
+        )
+        if not chunk:
+            return
+        yield from chunk
+        last_id = chunk[-1][0].id
+
+
+def render_payroll_run_slips(db: Session, run_id: int) -> bytes:
+    # Every slip of the run as the pages of one PDF, for printing
+    run = get_payroll_run(db, run_id)
+    pay_period = date(run["year"], run["month"], 1)
+    return render_salary_slips(
+        _item_slip(item, employee, firstname, pay_period)
+        for item, employee, firstname in _iter_run_items(db, run_id)
+    )
+
+
+def iter_payroll_run_zip(run_id: int):
+    # One PDF per employee, streamed as a ZIP. Slips rendered by the run are
+    # sent as stored, the others are rendered from the snapshot. The response
+    # outlives the request session, so the stream reads with its own.
+    db = SessionLocal()
+    try:
+        run = get_payroll_run(db, run_id)
+        pay_period = date(run["year"], run["month"], 1)
+        yield from iter_zip(
+            (
+                f"{employee.employee_id}_{run['year']}_{run['month']:02d}.pdf",
+                item.pdf
+                or render_salary_slip(
+                    _item_slip(item, employee, firstname, pay_period)
+                ),
+            )
+            for item, employee, firstname in _iter_run_items(db, run_id)
+        )
+    finally:
+        db.close()
@@ -1,8 +1,18 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
 from datetime import datetime
 
-import requests
+import httpx
+from sqlalchemy.dialects import mysql, sqlite
 
 from src.core.ecommerce_database import EcomSessionLocal
+from src.core.product_facets import facet_cache
+from src.core.product_search import rebuild_product_search
+from src.core.sql_cache import clear_query_caches
 from src.models.ecommerce_models import (
     Dimensions,
     Meta,
@@ -12,7 +22,35 @@ from src.models.ecommerce_models import (
     Review,
 )
 
-API_URL = "https://dummyjson.com/products?limit=100&skip={}"
+PRODUCTS_API_URL = os.getenv("PRODUCTS_API_URL", "https://dummyjson.com/products")
+PAGE_SIZE = 100
+FETCH_CONCURRENCY = int(os.getenv("PRODUCTS_FETCH_CONCURRENCY", 8))
+FETCH_RETRIES = 3
+UPSERT_CHUNK_SIZE = 500
+# Stored for a review without them: NULLs never collide in the unique key of
+# reviews, so such a review would be inserted again on every sync
+MISSING_REVIEWER_EMAIL = ""
+MISSING_REVIEW_DATE = datetime(1970, 1, 1)
+
+logger = logging.getLogger(__name__)
+
+# Progress of the running or last sync, read by the status endpoint
+sync_status = {
+    "state": "idle",
+    "started_at": None,
+    "finished_at": None,
+    "pages_total": 0,
+    "pages_done": 0,
+    "products_fetched": 0,
+    "mode": None,
+    "inserted": 0,
+    "updated": 0,
+    "unchanged": 0,
+    "child_rows_written": 0,
+    "child_rows_deleted": 0,
+    "error": None,
+}
+_sync_lock = threading.Lock()
 
 
 def parse_date(date_str):
@@ -21,108 +59,314 @@ def parse_date(date_str):
     return datetime.fromisoformat(date_str.replace("Z", ""))
 
 
-def fetch_all_products():
-    skip = 0
-    all_products = []
+async def _fetch_page(client, semaphore, skip: int) -> dict:
+    async with semaphore:
+        for attempt in range(FETCH_RETRIES):
+            try:
+                response = await client.get(
+                    PRODUCTS_API_URL, params={"limit": PAGE_SIZE, "skip": skip}
+                )
+                response.raise_for_status()
+                break
+            except httpx.HTTPError:
+                if attempt == FETCH_RETRIES - 1:
+                    raise
+                await asyncio.sleep(2**attempt)
+    sync_status["pages_done"] += 1
+    return response.json()
 
-    while True:
-        response = requests.get(API_URL.format(skip))
-        data = response.json()
 
-        products = data.get("products", [])
-        all_products.extend(products)
+async def fetch_all_products() -> list:
+    # The first page tells the total, the others are fetched concurrently
+    semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+    async with httpx.AsyncClient(timeout=30) as client:
+        first = await _fetch_page(client, semaphore, 0)
+        total = first.get("total", 0)
+        sync_status["pages_total"] = max(1, -(-total // PAGE_SIZE))
+        pages = await asyncio.gather(
+            *(
+                _fetch_page(client, semaphore, skip)
+                for skip in range(PAGE_SIZE, total, PAGE_SIZE)
+            )
+        )
+    products = {}
+    for page in [first, *pages]:
+        for p in page.get("products", []):
+            products[p["id"]] = p
+    return list(products.values())
 
-        if len(products) == 0:
-            break
 
-        skip += 100
+# Natural key of each table, backed by a unique index
+UPSERT_KEYS = {
+    Product: ["id"],
+    Dimensions: ["product_id"],
+    ProductTag: ["product_id", "tag"],
+    ProductImage: ["product_id", "url"],
+    Review: ["product_id", "reviewer_email", "date"],
+    Meta: ["product_id"],
+}
 
-        if skip >= data.get("total", 0):
-            break
+# Columns refreshed when a row already exists, by table
+UPDATE_COLUMNS = {
+    Product: [
+        column.name for column in Product.__table__.columns if column.name != "id"
+    ],
+    Dimensions: ["width", "height", "depth"],
+    ProductTag: ["tag"],
+    ProductImage: ["url"],
+    Review: ["rating", "comment", "reviewer_name"],
+    Meta: ["created_at", "updated_at", "barcode", "qr_code"],
+}
 
-    return all_products
 
+def _upsert(db, model, rows: list, update_columns: list):
+    # INSERT ... ON DUPLICATE KEY UPDATE on MySQL, ON CONFLICT on SQLite; the
+    # unique keys of the child tables make re-running a sync idempotent
+    if not rows:
+        return
+    table = model.__table__
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        chunk = rows[start : start + UPSERT_CHUNK_SIZE]
+        if db.bind.dialect.name == "mysql":
+            statement = mysql.insert(table).values(chunk)
+            statement = statement.on_duplicate_key_update(
+                {column: statement.inserted[column] for column in update_columns}
+            )
+        else:
+            statement = sqlite.insert(table).values(chunk)
+            statement = statement.on_conflict_do_update(
+                index_elements=UPSERT_KEYS[model],
+                set_={column: statement.excluded[column] for column in update_columns},
+            )
+        db.execute(statement)
 
-def load_products():
-    db = EcomSessionLocal()
 
-    products = fetch_all_products()
+def payload_hash(p: dict) -> str:
+    return hashlib.sha256(
+        json.dumps(p, sort_keys=True, separators=(",", ":")).encode()
+    ).hexdigest()
+
 
+def product_rows(products: list) -> dict:
+    # Row dicts per table for a list of API products
+    rows = {
+        Product: [],
+        Dimensions: [],
+        ProductTag: [],
+        ProductImage: [],
+        Review: [],
+        Meta: [],
+    }
     for p in products:
-        existing = db.query(Product).filter(Product.id == p["id"]).first()
-        if existing:
-            continue
-
-        product = Product(
-            id=p["id"],
-            title=p["title"],
-            description=p.get("description"),
-            category=p.get("category"),
-            price=p.get("price"),
-            discount_percentage=p.get("discountPercentage"),
-            rating=p.get("rating"),
-            stock=p.get("stock"),
-            brand=p.get("brand"),
-            sku=p.get("sku"),
-            weight=p.get("weight"),
-            warranty_information=p.get("warrantyInformation"),
-            shipping_information=p.get("shippingInformation"),
-            availability_status=p.get("availabilityStatus"),
-            return_policy=p.get("returnPolicy"),
-            minimum_order_quantity=p.get("minimumOrderQuantity"),
-            thumbnail=p.get("thumbnail"),
+        rows[Product].append(
+            {
+                "id": p["id"],
+                "title": p["title"],
+                "description": p.get("description"),
+                "category": p.get("category"),
+                "price": p.get("price"),
+                "discount_percentage": p.get("discountPercentage"),
+                "rating": p.get("rating"),
+                "stock": p.get("stock"),
+                "brand": p.get("brand"),
+                "sku": p.get("sku"),
+                "weight": p.get("weight"),
+                "warranty_information": p.get("warrantyInformation"),
+                "shipping_information": p.get("shippingInformation"),
+                "availability_status": p.get("availabilityStatus"),
+                "return_policy": p.get("returnPolicy"),
+                "minimum_order_quantity": p.get("minimumOrderQuantity"),
+                "thumbnail": p.get("thumbnail"),
+                "content_hash": payload_hash(p),
+            }
         )
-
-        db.add(product)
-        db.flush()
-
         if "dimensions" in p:
             d = p["dimensions"]
-            db.add(
-                Dimensions(
-                    product_id=product.id,
-                    width=d.get("width"),
-                    height=d.get("height"),
-                    depth=d.get("depth"),
-                )
+            rows[Dimensions].append(
+                {
+                    "product_id": p["id"],
+                    "width": d.get("width"),
+                    "height": d.get("height"),
+                    "depth": d.get("depth"),
+                }
             )
+        for tag in dict.fromkeys(p.get("tags", [])):
+            rows[ProductTag].append({"product_id": p["id"], "tag": tag})
+        for img in dict.fromkeys(p.get("images", [])):
+            rows[ProductImage].append({"product_id": p["id"], "url": img})
+        reviews = {}
+        for r in p.get("reviews", []):
+            review = {
+                "product_id": p["id"],
+                "rating": r.get("rating"),
+                "comment": r.get("comment"),
+                "date": parse_date(r.get("date")) or MISSING_REVIEW_DATE,
+                "reviewer_name": r.get("reviewerName"),
+                "reviewer_email": r.get("reviewerEmail") or MISSING_REVIEWER_EMAIL,
+            }
+            reviews[(review["reviewer_email"], review["date"])] = review
+        rows[Review].extend(reviews.values())
+        if "meta" in p:
+            m = p["meta"]
+            rows[Meta].append(
+                {
+                    "product_id": p["id"],
+                    "created_at": parse_date(m.get("createdAt")),
+                    "updated_at": parse_date(m.get("updatedAt")),
+                    "barcode": m.get("barcode"),
+                    "qr_code": m.get("qrCode"),
+                }
+            )
+    return rows
 
-        for tag in p.get("tags", []):
-            db.add(ProductTag(product_id=product.id, tag=tag))
 
-        for img in p.get("images", []):
-            db.add(ProductImage(product_id=product.id, url=img))
+CHILD_MODELS = (Dimensions, ProductTag, ProductImage, Review, Meta)
+IN_CHUNK_SIZE = 1000
 
-        for r in p.get("reviews", []):
-            db.add(
-                Review(
-                    product_id=product.id,
-                    rating=r.get("rating"),
-                    comment=r.get("comment"),
-                    date=parse_date(r.get("date")),
-                    reviewer_name=r.get("reviewerName"),
-                    reviewer_email=r.get("reviewerEmail"),
-                )
+
+def _chunks(values: list):
+    for start in range(0, len(values), IN_CHUNK_SIZE):
+        yield values[start : start + IN_CHUNK_SIZE]
+
+
+def _diff_children(db, model, product_ids: list, wanted: list):
+    # Stored child rows of the given products against the wanted ones, by
+    # natural key: only new or changed rows are written, missing ones deleted
+    key_columns = UPSERT_KEYS[model]
+    value_columns = [c for c in UPDATE_COLUMNS[model] if c not in key_columns]
+    columns = [getattr(model, name) for name in key_columns + value_columns]
+    current = {}
+    for ids in _chunks(product_ids):
+        for row in db.query(model.id, *columns).filter(model.product_id.in_(ids)):
+            values = tuple(row)[1:]
+            current[values[: len(key_columns)]] = (row.id, values[len(key_columns) :])
+
+    writes = []
+    wanted_keys = set()
+    for row in wanted:
+        key = tuple(row[name] for name in key_columns)
+        wanted_keys.add(key)
+        stored = current.get(key)
+        if stored is None or stored[1] != tuple(row[name] for name in value_columns):
+            writes.append(row)
+    stale = [row_id for key, (row_id, _) in current.items() if key not in wanted_keys]
+    for ids in _chunks(stale):
+        db.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+    _upsert(db, model, writes, UPDATE_COLUMNS[model])
+    return len(writes), len(stale)
+
+
+def write_products(db, products: list, existing_ids: set):
+    rows = product_rows(products)
+    _upsert(db, Product, rows[Product], UPDATE_COLUMNS[Product])
+    changed_ids = [p["id"] for p in products if p["id"] in existing_ids]
+    changed = set(changed_ids)
+    written = deleted = 0
+    for model in CHILD_MODELS:
+        # New products have no children to compare with
+        new_rows = [row for row in rows[model] if row["product_id"] not in changed]
+        _upsert(db, model, new_rows, UPDATE_COLUMNS[model])
+        written += len(new_rows)
+        if changed_ids:
+            model_written, model_deleted = _diff_children(
+                db,
+                model,
+                changed_ids,
+                [row for row in rows[model] if row["product_id"] in changed],
             )
+            written += model_written
+            deleted += model_deleted
+    return written, deleted
 
-        if "meta" in p:
-            m = p["meta"]
-            db.add(
-                Meta(
-                    product_id=product.id,
-                    created_at=parse_date(m.get("createdAt")),
-                    updated_at=parse_date(m.get("updatedAt")),
-                    barcode=m.get("barcode"),
-                    qr_code=m.get("qrCode"),
-                )
+
+def load_products(mode: str = "incremental"):
+    # incremental writes only products whose payload hash changed, full
+    # rewrites every product and still diffs the child rows
+    db = EcomSessionLocal()
+    sync_status["mode"] = mode
+    try:
+        products = asyncio.run(fetch_all_products())
+        sync_status["products_fetched"] = len(products)
+
+        # One lookup of the stored hashes for the whole catalog
+        stored_hashes = {}
+        for ids in _chunks([p["id"] for p in products]):
+            stored_hashes.update(
+                db.query(Product.id, Product.content_hash).filter(Product.id.in_(ids))
             )
+        to_write = [
+            p
+            for p in products
+            if mode == "full" or stored_hashes.get(p["id"], "") != payload_hash(p)
+        ]
+        written, deleted = write_products(db, to_write, set(stored_hashes))
+        db.commit()
+        if to_write:
+            facet_cache.clear()
+            clear_query_caches()
+            rebuild_product_search()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    inserted = sum(1 for p in to_write if p["id"] not in stored_hashes)
+    sync_status.update(
+        {
+            "inserted": inserted,
+            "updated": len(to_write) - inserted,
+            "unchanged": len(products) - len(to_write),
+            "child_rows_written": written,
+            "child_rows_deleted": deleted,
+        }
+    )
+    logger.info(
+        f"Synced {len(products)} products: {inserted} new, "
+        f"{len(to_write) - inserted} changed"
+    )
+    return dict(sync_status)
 
-    db.commit()
-    db.close()
 
-    print(f"Imported {len(products)} products successfully!")
+def start_product_sync() -> bool:
+    # False when a sync is already running in this process
+    with _sync_lock:
+        if sync_status["state"] == "running":
+            return False
+        sync_status.update(
+            {
+                "state": "running",
+                "started_at": datetime.now(),
+                "finished_at": None,
+                "pages_total": 0,
+                "pages_done": 0,
+                "products_fetched": 0,
+                "mode": None,
+                "inserted": 0,
+                "updated": 0,
+                "unchanged": 0,
+                "child_rows_written": 0,
+                "child_rows_deleted": 0,
+                "error": None,
+            }
+        )
+    return True
 
 
-if __name__ == "__main__":
+def run_product_sync(mode: str = "incremental"):
+    # Background job, started with start_product_sync()
+    try:
+        load_products(mode)
+        sync_status["state"] = "completed"
+    except Exception as e:
+        sync_status["state"] = "failed"
+        sync_status["error"] = str(e)
+    finally:
+        sync_status["finished_at"] = datetime.now()
 
-    load_products()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    start_product_sync()
+    run_product_sync()
+    logger.info(sync_status)
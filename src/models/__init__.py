@@ -1,7 +1,10 @@
 from src.core.database import Base
 from src.models.association import employee_role
 from src.models.chathistory import ChatHistory
+from src.models.email import EmailOutbox
 from src.models.employee import EmployeeEmploymentDetails
+from src.models.holiday import Holiday
 from src.models.leave import EmployeeLeave
+from src.models.payroll import PayrollRun, PayrollRunItem
 from src.models.personal import EmployeeOnboarding
 from src.models.role import Role, RoleFunction
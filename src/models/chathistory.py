@@ -1,7 +1,8 @@
-from sqlalchemy import TIMESTAMP, Column, ForeignKey, Integer, String, Text
+from sqlalchemy import TIMESTAMP, Column, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import relationship, validates
 from sqlalchemy.sql import func
 
+from src.core.compression import CompressedText
 from src.core.database import Base
 
 
@@ -12,9 +13,17 @@ class ChatHistory(Base):
     employee_id = Column(
         String(100), ForeignKey("employee_employment_details.employee_id")
     )  # Change to String(100)
-    question = Column(String(255))
-    response = Column(Text)
+    # Stored compressed, read back as str; see scripts/migrate_chat_compression.py
+    question = Column(CompressedText(1024))
+    response = Column(CompressedText(2**24))
     timestamp = Column(TIMESTAMP, server_default=func.now())
     expiration_timestamp = Column(TIMESTAMP)
 
     employee = relationship("EmployeeEmploymentDetails", back_populates="chathistory")
+
+    __table_args__ = (
+        # Newest-first history pages of one employee
+        Index("ix_chat_history_employee_timestamp", "employee_id", "timestamp", "id"),
+        # Retention purges walk this index in batches
+        Index("ix_chat_history_expiration", "expiration_timestamp"),
+    )
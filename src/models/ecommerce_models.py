@@ -1,4 +1,13 @@
-from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, String, Text
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+)
 from sqlalchemy.orm import relationship
 
 from src.core.ecommerce_database import EcomBase
@@ -25,6 +34,8 @@ class Product(EcomBase):
     return_policy = Column(String(255))
     minimum_order_quantity = Column(Integer)
     thumbnail = Column(String(500))
+    # sha256 of the API payload of the last sync, unchanged products are skipped
+    content_hash = Column(String(64))
 
     dimensions = relationship("Dimensions", back_populates="product", uselist=False)
     reviews = relationship("Review", back_populates="product")
@@ -32,6 +43,13 @@ class Product(EcomBase):
     tags = relationship("ProductTag", back_populates="product")
     meta = relationship("Meta", back_populates="product", uselist=False)
 
+    # Sorting and keyset pagination of product search, see SORT_COLUMNS
+    __table_args__ = (
+        Index("ix_products_category_price", "category", "price"),
+        Index("ix_products_brand_price", "brand", "price"),
+        Index("ix_products_rating", "rating"),
+    )
+
 
 class Dimensions(EcomBase):
     __tablename__ = "dimensions"
@@ -44,6 +62,8 @@ class Dimensions(EcomBase):
 
     product = relationship("Product", back_populates="dimensions")
 
+    __table_args__ = (Index("uq_dimensions_product", "product_id", unique=True),)
+
 
 class Review(EcomBase):
     __tablename__ = "reviews"
@@ -58,6 +78,16 @@ class Review(EcomBase):
 
     product = relationship("Product", back_populates="reviews")
 
+    __table_args__ = (
+        Index(
+            "uq_reviews_product_reviewer",
+            "product_id",
+            "reviewer_email",
+            "date",
+            unique=True,
+        ),
+    )
+
 
 class ProductImage(EcomBase):
     __tablename__ = "product_images"
@@ -68,6 +98,10 @@ class ProductImage(EcomBase):
 
     product = relationship("Product", back_populates="images")
 
+    __table_args__ = (
+        Index("uq_product_images_url", "product_id", "url", unique=True),
+    )
+
 
 class ProductTag(EcomBase):
     __tablename__ = "product_tags"
@@ -78,6 +112,10 @@ class ProductTag(EcomBase):
 
     product = relationship("Product", back_populates="tags")
 
+    __table_args__ = (
+        Index("uq_product_tags_tag", "product_id", "tag", unique=True),
+    )
+
 
 class Meta(EcomBase):
     __tablename__ = "product_meta"
@@ -90,3 +128,5 @@ class Meta(EcomBase):
     qr_code = Column(Text)
 
     product = relationship("Product", back_populates="meta")
+
+    __table_args__ = (Index("uq_product_meta_product", "product_id", unique=True),)
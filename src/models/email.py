@@ -0,0 +1,45 @@
+from enum import Enum as PyEnum
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Enum,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+)
+from sqlalchemy.sql import func
+
+from src.core.database import Base
+
+
+class EmailStatus(PyEnum):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+class EmailOutbox(Base):
+    # Outgoing mail. Requests only insert here, the delivery worker sends
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    recipient = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=False)
+    body = Column(Text, nullable=False)
+    attachment = Column(LargeBinary(length=2**24))
+    attachment_name = Column(String(255))
+    # Pending emails sharing a key are sent together as one digest
+    digest_key = Column(String(255), index=True)
+    status = Column(Enum(EmailStatus), default=EmailStatus.PENDING, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=func.now(), nullable=False)
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+    sent_at = Column(DateTime)
+
+    __table_args__ = (
+        Index("ix_email_outbox_status_next", "status", "next_attempt_at", "id"),
+    )
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Date, DateTime, Integer, String, UniqueConstraint
+from sqlalchemy.sql import func
+
+from src.core.database import Base
+
+
+class Holiday(Base):
+    __tablename__ = "holidays"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Matches EmployeeEmploymentDetails.work_location, NULL applies everywhere
+    work_location = Column(String(100), nullable=True)
+    holiday_date = Column(Date, nullable=False, index=True)
+    name = Column(String(100), nullable=False)
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("work_location", "holiday_date", name="uq_holiday_location"),
+    )
@@ -8,9 +8,11 @@ from sqlalchemy import (
     Enum,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
+    UniqueConstraint,
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -52,6 +54,15 @@ class EmployeeLeave(Base):
 
     employee = relationship("EmployeeEmploymentDetails", back_populates="leaves")
 
+    __table_args__ = (
+        # Pending-leave work queue, keyset paginated on (created_at, id)
+        Index("ix_employee_leaves_status_created", "status", "created_at", "id"),
+        # Overlap and team-capacity range queries
+        Index(
+            "ix_employee_leaves_employee_range", "employee_id", "start_date", "end_date"
+        ),
+    )
+
 
 class LeaveCalendar(Base):
     __tablename__ = "leavecalendar"
@@ -72,3 +83,37 @@ class LeaveCalendar(Base):
     employee = relationship(
         "EmployeeEmploymentDetails", back_populates="leave_calendar"
     )
+
+
+class LeaveSummary(Base):
+    # Projection of employee_leaves per employee, leave type and month,
+    # maintained by src/crud/leave_summary.py on every leave write
+    __tablename__ = "leave_summary"
+
+    id = Column(Integer, primary_key=True, index=True)
+    employee_id = Column(
+        Integer, ForeignKey("employee_employment_details.id"), nullable=False
+    )
+    leave_type = Column(String(50), nullable=False)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    approved_days = Column(Float, default=0.0, nullable=False)
+    pending_count = Column(Integer, default=0, nullable=False)
+    rejected_count = Column(Integer, default=0, nullable=False)
+    updated_at = Column(
+        DateTime, default=func.now(), onupdate=func.now(), nullable=False
+    )
+
+    __table_args__ = (
+        UniqueConstraint(
+            "employee_id", "leave_type", "year", "month", name="uq_leave_summary_key"
+        ),
+    )
+
+
+class LeaveSummaryState(Base):
+    # One row, written by the first full rebuild of leave_summary
+    __tablename__ = "leave_summary_state"
+
+    id = Column(Integer, primary_key=True)
+    rebuilt_at = Column(DateTime, default=func.now(), nullable=False)
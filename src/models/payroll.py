@@ -0,0 +1,80 @@
+from enum import Enum as PyEnum
+
+from sqlalchemy import (
+    DECIMAL,
+    Column,
+    DateTime,
+    Enum,
+    Float,
+    ForeignKey,
+    Integer,
+    LargeBinary,
+    Text,
+    UniqueConstraint,
+)
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+
+from src.core.database import Base
+
+
+class PayrollRunStatus(PyEnum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class PayrollItemStatus(PyEnum):
+    PENDING = "pending"
+    RENDERED = "rendered"
+    FAILED = "failed"
+
+
+class PayrollRun(Base):
+    __tablename__ = "payroll_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    status = Column(
+        Enum(PayrollRunStatus), default=PayrollRunStatus.PENDING, nullable=False
+    )
+    created_at = Column(DateTime, default=func.now(), nullable=False)
+    updated_at = Column(
+        DateTime, default=func.now(), onupdate=func.now(), nullable=False
+    )
+
+    items = relationship("PayrollRunItem", back_populates="run")
+
+    __table_args__ = (UniqueConstraint("year", "month", name="uq_payroll_run_period"),)
+
+
+class PayrollRunItem(Base):
+    # One employee of a run; inputs are snapshotted when the run is created so
+    # a resumed run renders exactly what the first attempt would have
+    __tablename__ = "payroll_run_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    run_id = Column(Integer, ForeignKey("payroll_runs.id"), nullable=False)
+    employee_id = Column(
+        Integer, ForeignKey("employee_employment_details.id"), nullable=False
+    )
+    status = Column(
+        Enum(PayrollItemStatus), default=PayrollItemStatus.PENDING, nullable=False
+    )
+    basic_salary = Column(DECIMAL(10, 2))
+    working_days = Column(Integer, nullable=False)
+    unpaid_days = Column(Float, default=0.0, nullable=False)
+    net_pay = Column(DECIMAL(10, 2))
+    pdf = Column(LargeBinary(length=2**24))
+    error = Column(Text)
+    updated_at = Column(
+        DateTime, default=func.now(), onupdate=func.now(), nullable=False
+    )
+
+    run = relationship("PayrollRun", back_populates="items")
+
+    __table_args__ = (
+        UniqueConstraint("run_id", "employee_id", name="uq_payroll_item_employee"),
+    )
@@ -23,6 +23,7 @@ from src.crud.leave import (
     leave_calender,
     update_leave_calendar,
 )
+from src.crud.leave_summary import check_leave_summary, rebuild_leave_summary
 from src.crud.personal import get_employee, update_employee
 from src.models.personal import EmployeeOnboarding
 from src.schemas.employee import (
@@ -288,3 +289,15 @@ async def create_leave_calendar(db: Session = Depends(get_db)):
 @router.get("/calender/{employee_id}", dependencies=[Depends(roles_required("admin"))])
 async def get_leave_calendar(employee_id: str, db: Session = Depends(get_db)):
     return get_calender_admin(db, employee_id)
+
+
+@router.post(
+    "/leave-summary/rebuild", dependencies=[Depends(roles_required("admin"))]
+)
+def rebuild_leave_summary_route(db: Session = Depends(get_db)):
+    return rebuild_leave_summary(db)
+
+
+@router.get("/leave-summary/check", dependencies=[Depends(roles_required("admin"))])
+def check_leave_summary_route(db: Session = Depends(get_db)):
+    return check_leave_summary(db)
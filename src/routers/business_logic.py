@@ -32,7 +32,8 @@ async def apply_leave_logic(
         )
     db_leave = create_employee_leave_logic(db, leave, employee_id)
     email_leav = db_leave["employee_email"]
-    await send_email_leave(
+    send_email_leave(
+        db,
         db_leave["employee_email"],
         db_leave["employee_firstname"],
         db_leave["employee_lastname"],
@@ -41,6 +42,7 @@ async def apply_leave_logic(
         db_leave["status"],
         db_leave["other_entries"],
     )
+    db.commit()
     return {
         "details": f"leave applied successfully for '{employee_id}' check your mail '{email_leav}'"
     }
@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
 from src.core.authentication import get_current_employee, roles_required
+from src.core.chat_ingest import chat_ingest
+from src.core.chat_search import chat_search
 from src.core.database import get_db
-from src.crud.chathistory import create_chat_message, get
+from src.crud.chathistory import get, get_history_page, retention_stats
 from src.schemas.chathistory import ChatHistoryCreate
 
 router = APIRouter()
@@ -13,13 +17,15 @@ router = APIRouter()
     "/create/history",
     dependencies=[Depends(roles_required("admin", "employee", "teamlead"))],
 )
-async def create_history(
+def create_history(
     data: ChatHistoryCreate,
     db: Session = Depends(get_db),
     current_employee=Depends(get_current_employee),
 ):
     employee_id = current_employee.employment_id
-    data = create_chat_message(db, employee_id, data.question, data.response)
+    # Buffered, written to the database by the ingest flusher. A plain def, the
+    # journal fsync and the employee lookup run in the threadpool.
+    data = chat_ingest.submit(db, employee_id, data.question, data.response)
     if not data:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -38,3 +44,41 @@ async def get_history(
 ):
     employee_id = current_employee.employment_id
     return get(db, employee_id)
+
+
+@router.get(
+    "/history/page",
+    dependencies=[Depends(roles_required("admin", "employee", "teamlead"))],
+)
+def get_history_page_route(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+    current_employee=Depends(get_current_employee),
+):
+    return get_history_page(db, current_employee.employment_id, limit, cursor)
+
+
+@router.get("/history/ingest/stats", dependencies=[Depends(roles_required("admin"))])
+def get_history_ingest_stats():
+    return chat_ingest.stats()
+
+
+@router.get(
+    "/history/retention/stats", dependencies=[Depends(roles_required("admin"))]
+)
+def get_history_retention_stats():
+    return retention_stats
+
+
+@router.get(
+    "/history/search",
+    dependencies=[Depends(roles_required("admin", "employee", "teamlead"))],
+)
+def search_history(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    current_employee=Depends(get_current_employee),
+):
+    return chat_search.search(current_employee.employment_id, q, limit, offset)
@@ -1,12 +1,18 @@
 from datetime import datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import and_, func, or_, text
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, bindparam, func, or_
+from sqlalchemy.orm import Session, selectinload
 
 from src.core.ecommerce_database import get_ecom_db
-from src.load_products import load_products
+from src.core.product_facets import facet_cache
+from src.core.product_search import product_search
+from src.core.sql_cache import query_plan_cache, query_result_cache
+from src.core.sql_query import explain_query, iter_query_ndjson, run_query
+from src.core.utils import decode_cursor, encode_cursor
+from src.load_products import run_product_sync, start_product_sync, sync_status
 from src.models.ecommerce_models import Dimensions, Meta, Product, ProductTag, Review
 
 router = APIRouter(
@@ -16,62 +22,69 @@ router = APIRouter(
 )
 
 
-@router.post("/sync-products")
-def sync_products():
-    load_products()
-    return {"message": "Products synced"}
+@router.post("/sync-products", status_code=status.HTTP_202_ACCEPTED)
+def sync_products(
+    background_tasks: BackgroundTasks,
+    mode: str = Query("incremental", pattern="^(incremental|full)$"),
+):
+    if not start_product_sync():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A product sync is already running",
+        )
+    background_tasks.add_task(run_product_sync, mode)
+    return {"message": "Product sync started", "status": sync_status}
+
+
+@router.get("/sync-products/status")
+def product_sync_status():
+    return sync_status
 
 
 @router.post("/query")
-def execute_sql_query(
-    sqlquery: str,
-    db: Session = Depends(get_ecom_db),
-):
+def execute_sql_query(sqlquery: str, stream: bool = False):
     """
     Execute read-only SQL queries on ecommerce DB.
     Supports JOIN, GROUP BY, ORDER BY, etc.
+    Results are capped at SQL_QUERY_MAX_ROWS; stream=true sends them as
+    newline-delimited JSON.
     """
-
-    sql_lower = sqlquery.strip().lower()
-
-    if not sql_lower.startswith("select"):
-        raise HTTPException(
-            status_code=400,
-            detail="Only SELECT queries are allowed",
+    if stream:
+        return StreamingResponse(
+            iter_query_ndjson(sqlquery), media_type="application/x-ndjson"
         )
+    return run_query(sqlquery)
 
-    dangerous_statements = [
-        "insert ",
-        "update ",
-        "delete ",
-        "drop ",
-        "alter ",
-        "truncate ",
-        "create table",
-        "replace ",
-    ]
-
-    if any(stmt in sql_lower for stmt in dangerous_statements):
-        raise HTTPException(
-            status_code=400,
-            detail="Dangerous SQL detected",
-        )
 
-    try:
-        result = db.execute(text(sqlquery))
-        rows = result.fetchall()
-        columns = result.keys()
+@router.post("/query/explain")
+def explain_sql_query(sqlquery: str):
+    return explain_query(sqlquery)
 
-        data = [dict(zip(columns, row)) for row in rows]
 
-        return {
-            "row_count": len(data),
-            "columns": list(columns),
-            "data": data,
-        }
+@router.get("/query/cache/stats")
+def sql_query_cache_stats():
+    return {"results": query_result_cache.stats(), "plans": query_plan_cache.stats()}
 
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+
+def load_products_by_ids(db: Session, product_ids: list) -> list:
+    # One query for the products and one per child collection, instead of
+    # lazy loads per product when serializing; keeps the order of product_ids
+    if not product_ids:
+        return []
+    products = (
+        db.query(Product)
+        .options(
+            selectinload(Product.dimensions),
+            selectinload(Product.meta),
+            selectinload(Product.tags),
+            selectinload(Product.images),
+            selectinload(Product.reviews),
+        )
+        .filter(Product.id.in_(product_ids))
+        .all()
+    )
+    by_id = {p.id: p for p in products}
+    return [by_id[product_id] for product_id in product_ids if product_id in by_id]
 
 
 def serialize_product(p: Product):
@@ -162,6 +175,33 @@ def serialize_product(p: Product):
 #     return [serialize_product(p) for p in products]
 
 
+# Sortable columns, each backed by an index; relevance sorts text search
+# results by score
+SORT_COLUMNS = {
+    "id": Product.id,
+    "price": Product.price,
+    "rating": Product.rating,
+}
+
+
+def _after_cursor(column, value, last_id: int, descending: bool) -> list:
+    # Conditions for the rows after (value, last_id) in (column, id) order, in
+    # the order they are read; each is one index range. NULL sorts before any
+    # value on both MySQL and SQLite: first ascending, last descending.
+    if column is Product.id:
+        return [Product.id < last_id if descending else Product.id > last_id]
+    if value is None:
+        if descending:
+            return [and_(column.is_(None), Product.id < last_id)]
+        return [and_(column.is_(None), Product.id > last_id), column.is_not(None)]
+    if descending:
+        return [
+            and_(column <= value, or_(column < value, Product.id < last_id)),
+            column.is_(None),
+        ]
+    return [and_(column >= value, or_(column > value, Product.id > last_id))]
+
+
 @router.get("/advanced-search")
 def advanced_search_products(
     # -------- Product filters --------
@@ -200,22 +240,40 @@ def advanced_search_products(
     # -------- Pagination --------
     limit: int = Query(20, le=100),
     offset: int = 0,
+    cursor: Optional[str] = None,
+    # -------- Facet counts for the filters --------
+    facets: bool = False,
     db: Session = Depends(get_ecom_db),
 ):
 
-    query = db.query(Product)
-
-    # joins
-    query = query.outerjoin(Product.dimensions)
-    query = query.outerjoin(Product.meta)
-    query = query.outerjoin(Product.reviews)
-    query = query.outerjoin(Product.tags)
+    query = db.query(Product.id)
 
+    # Filters by relation: one-to-one tables are joined only when filtered on,
+    # one-to-many ones are EXISTS checks, so no row fan-out and no GROUP BY
     filters = []
+    dimension_filters = []
+    meta_filters = []
+    review_filters = []
 
     # ---------- TEXT filters ----------
-    if title:
-        filters.append(Product.title.ilike(f"%{title}%"))
+    # Text search over title, description, brand and tags from the in-memory
+    # index; a plain title match until the index is built
+    search_scores = product_search.search(title) if title else None
+    if search_scores is None:
+        if title:
+            filters.append(Product.title.ilike(f"%{title}%"))
+    elif len(search_scores) < product_search.products:
+        # Inlined, a long id list would exceed the bound parameter limit
+        filters.append(
+            Product.id.in_(
+                bindparam(
+                    "search_ids",
+                    list(search_scores),
+                    expanding=True,
+                    literal_execute=True,
+                )
+            )
+        )
 
     if category:
         filters.append(Product.category == category)
@@ -259,58 +317,148 @@ def advanced_search_products(
 
     # ---------- DIMENSIONS ----------
     if min_width is not None:
-        filters.append(Dimensions.width >= min_width)
+        dimension_filters.append(Dimensions.width >= min_width)
     if max_width is not None:
-        filters.append(Dimensions.width <= max_width)
+        dimension_filters.append(Dimensions.width <= max_width)
 
     if min_height is not None:
-        filters.append(Dimensions.height >= min_height)
+        dimension_filters.append(Dimensions.height >= min_height)
     if max_height is not None:
-        filters.append(Dimensions.height <= max_height)
+        dimension_filters.append(Dimensions.height <= max_height)
 
     if min_depth is not None:
-        filters.append(Dimensions.depth >= min_depth)
+        dimension_filters.append(Dimensions.depth >= min_depth)
     if max_depth is not None:
-        filters.append(Dimensions.depth <= max_depth)
+        dimension_filters.append(Dimensions.depth <= max_depth)
 
     # ---------- META ----------
     if barcode:
-        filters.append(Meta.barcode == barcode)
+        meta_filters.append(Meta.barcode == barcode)
 
     if created_after:
-        filters.append(Meta.created_at >= created_after)
+        meta_filters.append(Meta.created_at >= created_after)
 
     if created_before:
-        filters.append(Meta.created_at <= created_before)
+        meta_filters.append(Meta.created_at <= created_before)
 
     # ---------- REVIEWS ----------
     if min_review_rating is not None:
-        filters.append(Review.rating >= min_review_rating)
+        review_filters.append(Review.rating >= min_review_rating)
 
     if reviewer_name:
-        filters.append(Review.reviewer_name.ilike(f"%{reviewer_name}%"))
+        review_filters.append(Review.reviewer_name.ilike(f"%{reviewer_name}%"))
 
     # ---------- TAGS ----------
     if tags:
-        filters.append(ProductTag.tag.in_(tags))
+        # Sorted so the same tags in another order share facet cache entries
+        tags = sorted(set(tags))
+        filters.append(Product.tags.any(ProductTag.tag.in_(tags)))
+
+    # One review has to match all review filters
+    if review_filters:
+        filters.append(Product.reviews.any(and_(*review_filters)))
+
+    if dimension_filters:
+        query = query.join(Product.dimensions)
+        filters.extend(dimension_filters)
+
+    if meta_filters:
+        query = query.join(Product.meta)
+        filters.extend(meta_filters)
 
     if filters:
         query = query.filter(and_(*filters))
 
-    # ---------- GROUPING ----------
-    query = query.group_by(Product.id)
-
-    # ---------- SORTING ----------
-    sort_column = getattr(Product, sort_by, Product.id)
+    filtered = query
 
-    if sort_order == "desc":
-        query = query.order_by(sort_column.desc())
+    if sort_by not in SORT_COLUMNS and sort_by != "relevance":
+        raise HTTPException(
+            status_code=400,
+            detail=f"sort_by must be one of {', '.join([*SORT_COLUMNS, 'relevance'])}",
+        )
+    descending = sort_order == "desc"
+    after = None
+    if cursor:
+        cursor_sort, *after = decode_cursor(cursor, str, (int, float, type(None)), int)
+        if cursor_sort != f"{sort_by}:{sort_order}":
+            raise HTTPException(
+                status_code=400, detail="Cursor belongs to another sort order"
+            )
+        if sort_by == "relevance" and after[0] is None:
+            raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+    if sort_by == "relevance" and search_scores is not None:
+        # Best text matches first, ranked in memory; ties by id
+        matching = {product_id for (product_id,) in query}
+        ranked = [
+            (score, product_id)
+            for product_id, score in search_scores.items()
+            if product_id in matching
+        ]
+        if after:
+            ranked = [
+                (score, product_id)
+                for score, product_id in ranked
+                if (-score, product_id) > (-after[0], after[1])
+            ]
+        else:
+            ranked = ranked[offset:]
+        page = ranked[: limit + 1]
     else:
-        query = query.order_by(sort_column.asc())
+        # ---------- SORTING ----------
+        # Sort column then id, so ties keep one order across pages
+        sort_column = SORT_COLUMNS.get(sort_by, Product.id)
+        query = filtered.add_columns(sort_column)
+        order = [sort_column, Product.id]
+        if sort_column is Product.id:
+            order = [Product.id]
+        if descending:
+            query = query.order_by(*[column.desc() for column in order])
+        else:
+            query = query.order_by(*[column.asc() for column in order])
+
+        # ---------- PAGINATION ----------
+        # Keyset with a cursor, offset otherwise; one extra row tells whether
+        # another page exists
+        if after:
+            ranges = _after_cursor(sort_column, after[0], after[1], descending)
+        else:
+            ranges = [None]
+            query = query.offset(offset)
+        page = []
+        for condition in ranges:
+            if len(page) > limit:
+                break
+            rows = query if condition is None else query.filter(condition)
+            page += [
+                (value, product_id)
+                for product_id, value in rows.limit(limit + 1 - len(page))
+            ]
+
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(f"{sort_by}:{sort_order}", *page[-1])
+    product_ids = [product_id for _, product_id in page]
+
+    # The page of ids first, then the products with their children in bulk
+    results = load_products_by_ids(db, product_ids)
+
+    response = {
+        "count": len(results),
+        "next_cursor": next_cursor,
+        "products": [serialize_product(p) for p in results],
+    }
+    if facets:
+        response["facets"] = facet_cache.get_or_count(db, filtered)
+    return response
+
 
-    # ---------- PAGINATION ----------
-    query = query.offset(offset).limit(limit)
+@router.get("/search-index/stats")
+def product_search_index_stats():
+    return product_search.stats()
 
-    results = query.all()
 
-    return {"count": len(results), "products": [serialize_product(p) for p in results]}
+@router.get("/facets/stats")
+def product_facet_cache_stats():
+    return facet_cache.stats()
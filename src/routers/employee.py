@@ -1,11 +1,18 @@
-import calendar
 import io
-from datetime import datetime
+from datetime import date
 from typing import Optional
 
-import fillpdf.fillpdfs as fillpdfs
-from dateutil.relativedelta import relativedelta
-from fastapi import APIRouter, Depends, HTTPException, Path, Query, status
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    Header,
+    HTTPException,
+    Path,
+    Query,
+    status,
+)
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.orm import Session
 
 from src.core.authentication import (
@@ -14,7 +21,14 @@ from src.core.authentication import (
     roles_required,
 )
 from src.core.database import get_db
+from src.core.salary_slip import (
+    compute_salary_slip,
+    render_salary_slip,
+    salary_slip_cache,
+    salary_slip_key,
+)
 from src.core.utils import normalize_string, send_email_with_pdf_attachment
+from src.core.workcalendar import work_calendar
 from src.crud.employee import (
     create_employee_employment_details,
     delete_employee_employment_details,
@@ -24,7 +38,15 @@ from src.crud.employee import (
     get_all_employees,
     update_employee_employment_details,
 )
-from src.crud.leave import get_leave_for_slip
+from src.crud.leave_summary import get_unpaid_leave_days
+from src.crud.payroll import (
+    create_payroll_run,
+    get_payroll_run,
+    is_payroll_run_active,
+    iter_payroll_run_zip,
+    process_payroll_run,
+    render_payroll_run_slips,
+)
 from src.schemas.employee import (
     EmployeeEmploymentDetailsCreate,
     EmployeeEmploymentDetailsUpdate,
@@ -57,11 +79,69 @@ async def read_employee(
     return db_employee
 
 
-def write_fillable_pdf(
-    input_pdf_path: str, output_pdf_stream: io.BytesIO, data_dict: dict
+def _slip_period(month: int) -> date:
+    # The latest occurrence of month that is not in the future
+    today = date.today()
+    year = today.year if month <= today.month else today.year - 1
+    return date(year, month, 1)
+
+
+def _employee_salary_slip(db: Session, employee_id: str, month: int):
+    pay_period = _slip_period(month)
+    db_employee = get_all_employee_details_slip(db, employee_id)
+    days_in_month = work_calendar.working_days_in_month(
+        db, db_employee.work_location, pay_period.year, month
+    )
+    count_of_leave = get_unpaid_leave_days(
+        db, db_employee.id, year=pay_period.year, month=month
+    )
+    # The pay period rather than today, so the slip and its cache key only
+    # change with its inputs
+    slip = compute_salary_slip(
+        db_employee.basic_salary,
+        days_in_month,
+        count_of_leave,
+        date_of_joining=db_employee.start_date,
+        pay_period=pay_period,
+        employee_name=db_employee.employee.firstname,
+        designation=db_employee.job_position,
+        department=db_employee.department,
+    )
+    return db_employee, slip
+
+
+@router.get(
+    "/salary-slip/{month}/download",
+    dependencies=[Depends(roles_required("admin", "employee", "teamlead"))],
+)
+def download_salary_slip(
+    month: int = Path(..., ge=1, le=12),
+    if_none_match: Optional[str] = Header(None),
+    current_employee=Depends(get_current_employee),
+    db: Session = Depends(get_db),
 ):
-    # Fill the PDF with the provided data
-    fillpdfs.write_fillable_pdf(input_pdf_path, output_pdf_stream, data_dict)
+    employee_id = current_employee.employment_id
+    _, slip = _employee_salary_slip(db, employee_id, month)
+    key = salary_slip_key(employee_id, _slip_period(month).year, month, slip)
+    etag = f'"{key}"'
+    headers = {
+        "ETag": etag,
+        # Personal data: browsers may keep it, shared caches may not
+        "Cache-Control": "private, no-cache",
+    }
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    pdf = salary_slip_cache.get_or_render(key, slip)
+    headers["Content-Disposition"] = (
+        f"attachment; filename=salary_slip_{employee_id}_{month:02d}.pdf"
+    )
+    headers["Content-Length"] = str(len(pdf))
+    return StreamingResponse(
+        (pdf[i : i + 65536] for i in range(0, len(pdf), 65536)),
+        media_type="application/pdf",
+        headers=headers,
+    )
 
 
 @router.get(
@@ -75,64 +155,13 @@ async def get_salary_slip(
 ):
     try:
         employee_id = current_employee.employment_id
-        current_date = datetime.now()
-        current_month = current_date.month
-        current_year = current_date.year
-        new_date = current_date - relativedelta(months=1)
-        new_month = new_date.month
-        new_year = new_date.year
-        db_employee = get_all_employee_details_slip(db, employee_id)
-        days_in_month = calendar.monthrange(current_year, month)[1]
-        leave = get_leave_for_slip(db, employee_id, month=month, year=new_year)
-        leave_data = [leaves.id for leaves in leave]
-        count_of_leave = len(leave_data)
-        total_days = days_in_month - count_of_leave
-        per_day = db_employee.basic_salary / days_in_month
-        total_salary = per_day * total_days
-        rounded_salary = round(total_salary)
-
-        form_fil = list(fillpdfs.get_form_fields("salary_slip.pdf").keys())
-        date_emplo = db_employee.start_date
-        # Format the date to only display the date part (without time)
-        pay_period = current_date.strftime(
-            "%d-%m-%Y"
-        )  # You can adjust the format as needed
-        date_emplo = date_emplo.strftime("%d-%m-%Y")
-        data = {
-            form_fil[0]: date_emplo,  # Date of Joining
-            form_fil[1]: pay_period,  # Pay period (only date)
-            form_fil[2]: total_days,  # Worked days
-            form_fil[3]: db_employee.employee.firstname,  # Employee name
-            form_fil[4]: db_employee.job_position,  # Designation
-            form_fil[5]: db_employee.department,  # Department
-            form_fil[6]: days_in_month,  # Totalwokin days
-            form_fil[7]: "0",  # carryover
-            form_fil[8]: round(count_of_leave),  # leave days
-            form_fil[9]: "0",  # application leave
-            form_fil[10]: round(db_employee.basic_salary),  # Fixed pay
-            form_fil[11]: "0",  # Days Allownces
-            form_fil[12]: round(per_day * count_of_leave),  # Other deductions
-            form_fil[13]: "0",  # loan deducction
-            form_fil[14]: "0",  # adbsence deductions
-            form_fil[15]: round(db_employee.basic_salary),  # Total earings
-            form_fil[16]: round(per_day * count_of_leave),  # Total deductions
-            form_fil[17]: rounded_salary,  # netpay
-        }
-
-        # fillpdfs.write_fillable_pdf(input_pdf_path='salary_slip.pdf',output_pdf_path='new.pdf',data_dict=data)
+        db_employee, slip = _employee_salary_slip(db, employee_id, month)
         # Create an in-memory PDF
-        pdf_stream = io.BytesIO()
-        write_fillable_pdf(
-            input_pdf_path="salary_slip.pdf",
-            output_pdf_stream=pdf_stream,
-            data_dict=data,
-        )
-
-        # Move to the beginning of the BytesIO stream
-        pdf_stream.seek(0)
+        pdf_stream = io.BytesIO(render_salary_slip(slip))
 
         # Send the email with the PDF attachment
-        send_email_with_pdf_attachment(db_employee.employee_email, pdf_stream)
+        send_email_with_pdf_attachment(db, db_employee.employee_email, pdf_stream)
+        db.commit()
 
         # Close the BytesIO stream
         pdf_stream.close()  # Clear the BytesIO stream from memory
@@ -145,3 +174,68 @@ async def get_salary_slip(
 @router.get("/employees", status_code=status.HTTP_200_OK)
 def fetch_all_employees(db: Session = Depends(get_db)):
     return get_all_employees(db)
+
+
+# Before /payroll-run/{year}/{month}, which would match "resume" as the month
+@router.post(
+    "/payroll-run/{run_id}/resume",
+    dependencies=[Depends(roles_required("admin"))],
+)
+def resume_payroll_run(
+    run_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)
+):
+    run = get_payroll_run(db, run_id)
+    if is_payroll_run_active(run_id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Payroll run id: '{run_id}' is already running",
+        )
+    background_tasks.add_task(process_payroll_run, run_id)
+    return run
+
+
+@router.post(
+    "/payroll-run/{year}/{month}",
+    dependencies=[Depends(roles_required("admin"))],
+)
+def start_payroll_run(
+    background_tasks: BackgroundTasks,
+    year: int = Path(..., ge=2000),
+    month: int = Path(..., ge=1, le=12),
+    db: Session = Depends(get_db),
+):
+    # Starting an existing period again resumes it
+    run = create_payroll_run(db, year, month)
+    background_tasks.add_task(process_payroll_run, run.id)
+    return get_payroll_run(db, run.id)
+
+
+@router.get(
+    "/payroll-run/{run_id}",
+    dependencies=[Depends(roles_required("admin"))],
+)
+def payroll_run_status(run_id: int, db: Session = Depends(get_db)):
+    return get_payroll_run(db, run_id)
+
+
+@router.get(
+    "/payroll-run/{run_id}/slips",
+    dependencies=[Depends(roles_required("admin"))],
+)
+def download_payroll_run_slips(
+    run_id: int,
+    format: str = Query("zip", pattern="^(zip|pdf)$"),
+    db: Session = Depends(get_db),
+):
+    run = get_payroll_run(db, run_id)
+    filename = f"salary_slips_{run['year']}_{run['month']:02d}.{format}"
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    if format == "pdf":
+        return Response(
+            render_payroll_run_slips(db, run_id),
+            media_type="application/pdf",
+            headers=headers,
+        )
+    return StreamingResponse(
+        iter_payroll_run_zip(run_id), media_type="application/zip", headers=headers
+    )
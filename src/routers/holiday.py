@@ -0,0 +1,63 @@
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+
+from src.core.authentication import roles_required
+from src.core.database import get_db
+from src.core.workcalendar import MAX_RANGE_YEARS, work_calendar
+from src.crud.holiday import create_holiday, delete_holiday, get_holidays
+from src.schemas.holiday import HolidayCreate, HolidayResponse
+
+router = APIRouter(
+    prefix="/holiday", tags=["holiday"], responses={400: {"detail": "Not found"}}
+)
+
+
+@router.post(
+    "/", response_model=HolidayResponse, dependencies=[Depends(roles_required("admin"))]
+)
+def add_holiday(holiday: HolidayCreate, db: Session = Depends(get_db)):
+    return create_holiday(db, holiday)
+
+
+@router.get(
+    "/working-days",
+    dependencies=[Depends(roles_required("admin", "employee", "teamlead"))],
+)
+def count_working_days(
+    start: date,
+    end: date,
+    work_location: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+):
+    if end.year - start.year >= MAX_RANGE_YEARS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"The range can span at most {MAX_RANGE_YEARS} calendar years",
+        )
+    return {
+        "start": start,
+        "end": end,
+        "work_location": work_location,
+        "working_days": work_calendar.working_days_between(
+            db, work_location, start, end
+        ),
+    }
+
+
+@router.get(
+    "/{year}",
+    response_model=List[HolidayResponse],
+    dependencies=[Depends(roles_required("admin", "employee", "teamlead"))],
+)
+def list_holidays(
+    year: int, work_location: Optional[str] = None, db: Session = Depends(get_db)
+):
+    return get_holidays(db, year, work_location)
+
+
+@router.delete("/{holiday_id}", dependencies=[Depends(roles_required("admin"))])
+def remove_holiday(holiday_id: int, db: Session = Depends(get_db)):
+    return delete_holiday(db, holiday_id)
@@ -1,8 +1,8 @@
+from datetime import date, datetime
 from typing import Optional
 
 from fastapi import (
     APIRouter,
-    BackgroundTasks,
     Depends,
     HTTPException,
     Path,
@@ -17,8 +17,9 @@ from src.core.authentication import (
     roles_required,
 )
 from src.core.database import get_db
-from src.core.utils import send_email_leave
+from src.core.utils import send_email_leave, send_email_leave_digest
 from src.crud.leave import (
+    bulk_update_employee_leaves,
     create_employee_leave,
     delete_employee_leave,
     get_calender,
@@ -31,14 +32,18 @@ from src.crud.leave import (
     get_leave_by_employee_team,
     get_leave_by_id,
     get_leave_by_report_manager,
+    get_pending_leave_queue,
+    get_team_availability,
     leave_calender,
     update_employee_leave,
     update_employee_teamlead,
     update_leave_calendar,
 )
+from src.crud.leave_summary import get_leave_summary
 from src.models.leave import LeaveCalendar
 from src.models.personal import EmployeeOnboarding
 from src.schemas.leave import (
+    EmployeeLeaveBulkUpdate,
     EmployeeLeaveCreate,
     EmployeeLeaveUpdate,
     LeaveCalendarUpdate,
@@ -81,7 +86,6 @@ router = APIRouter(
 @router.post("/")
 def apply_leave(
     leave: EmployeeLeaveCreate,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
 ):
     employee_id = "cds0003"
@@ -93,8 +97,8 @@ def apply_leave(
 
     db_leave = create_employee_leave(db, leave, employee_id)
 
-    background_tasks.add_task(
-        send_email_leave,
+    send_email_leave(
+        db,
         db_leave["employee_email"],
         db_leave["employee_firstname"],
         db_leave["employee_lastname"],
@@ -103,6 +107,7 @@ def apply_leave(
         db_leave["status"],
         db_leave["other_entries"],
     )
+    db.commit()
 
     return {
         "details": f"Leave applied successfully for '{employee_id}'. Email will be sent."
@@ -188,6 +193,54 @@ def get_leave_of_employee(
     return leave_details
 
 
+@router.get(
+    "/pending/queue",
+    dependencies=[Depends(roles_required("teamlead", "admin"))],
+)
+def get_pending_leave_queue_page(
+    leave_type: Optional[str] = None,
+    start_from: Optional[date] = None,
+    start_to: Optional[date] = None,
+    limit: int = Query(20, gt=0, le=100),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_employee=Depends(get_current_employee),
+):
+    employee_role = get_current_employee_roles(current_employee.id, db)
+    # Admins see the whole company queue, team leads only their reports
+    report_manager = (
+        None if employee_role.name == "admin" else current_employee.employment_id
+    )
+    return get_pending_leave_queue(
+        db,
+        report_manager=report_manager,
+        leave_type=leave_type,
+        start_from=start_from,
+        start_to=start_to,
+        limit=limit,
+        cursor=cursor,
+    )
+
+
+@router.get(
+    "/summary",
+    dependencies=[Depends(roles_required("employee", "teamlead", "admin"))],
+)
+def get_leave_summary_of_employee(
+    year: Optional[int] = None,
+    month: Optional[int] = Query(None, ge=1, le=12),
+    db: Session = Depends(get_db),
+    current_employee=Depends(get_current_employee),
+):
+    today = datetime.now()
+    return get_leave_summary(
+        db,
+        current_employee.employment_id,
+        year or today.year,
+        month or today.month,
+    )
+
+
 @router.get("/{monthnumber}/{yearnumber}")
 def get_leave_by_month(
     monthnumber: int, yearnumber: int, db: Session = Depends(get_db)
@@ -253,7 +306,8 @@ async def update_leave(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Leave not found {leave.leave_id}",
         )
-    await send_email_leave(
+    send_email_leave(
+        db,
         db_leave["employee_email"],
         db_leave["employee_firstname"],
         db_leave["employee_lastname"],
@@ -262,9 +316,45 @@ async def update_leave(
         db_leave["status"],
         db_leave["other_entires"],
     )
+    db.commit()
     return db_leave
 
 
+@router.put(
+    "/admin/teamlead/bulk-update",
+    dependencies=[Depends(roles_required("teamlead", "admin"))],
+)
+def bulk_update_leave(
+    leaves: EmployeeLeaveBulkUpdate,
+    db: Session = Depends(get_db),
+    current_employee=Depends(get_current_employee),
+):
+    employee_role = get_current_employee_roles(current_employee.id, db)
+    # Team leads may only decide on their own reports, admins on everyone
+    report_manager = (
+        None if employee_role.name == "admin" else current_employee.employment_id
+    )
+    digests = bulk_update_employee_leaves(db, leaves.decisions, report_manager)
+
+    for digest in digests:
+        send_email_leave_digest(
+            db,
+            digest["employee_email"],
+            digest["employee_firstname"],
+            digest["employee_lastname"],
+            digest["leaves"],
+        )
+    db.commit()
+
+    return {
+        "details": f"{len(leaves.decisions)} leave request(s) updated. Email will be sent.",
+        "employees": [
+            {"employee_id": digest["employee_code"], "leaves": digest["leaves"]}
+            for digest in digests
+        ],
+    }
+
+
 @router.delete(
     "/{leave_id}",
     dependencies=[Depends(roles_required("employee", "teamlead"))],
@@ -322,3 +412,21 @@ async def get_employee_under_tl(
     ]
 
     return datas
+
+
+@router.get(
+    "/teamlead/availability/{yearnumber}/{monthnumber}",
+    dependencies=[Depends(roles_required("admin", "teamlead"))],
+)
+def get_team_availability_heatmap(
+    yearnumber: int = Path(..., ge=1900),
+    monthnumber: int = Path(..., ge=1, le=12),
+    report_manager: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_employee=Depends(get_current_employee),
+):
+    employee_role = get_current_employee_roles(current_employee.id, db)
+    # Admins may look at any team, team leads only at their own
+    if employee_role.name != "admin" or not report_manager:
+        report_manager = current_employee.employment_id
+    return get_team_availability(db, report_manager, yearnumber, monthnumber)
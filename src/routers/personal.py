@@ -1,6 +1,6 @@
 from datetime import date, datetime
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Path, status
+from fastapi import APIRouter, Depends, HTTPException, Path, status
 from sqlalchemy.orm import Session
 
 from src.core.authentication import (
@@ -76,7 +76,6 @@ def convert_date_format(date_input):
 @router.post("/employees")
 def create_employee_route(
     employee: EmployeeCreate,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
 ):
     employee.firstname = normalize_string(employee.firstname)
@@ -90,14 +89,15 @@ def create_employee_route(
 
     details = create_employee(db, employee)
 
-    background_tasks.add_task(
-        send_email,
+    send_email(
+        db,
         recipient_email=details["emailaddress"],
         name=details["firstname"],
         lname=details["lastname"],
         Email=details["employee_email"],
         Password=details["password"],
     )
+    db.commit()
 
     return {"detail": "Employee created. Email will be sent shortly."}
 
@@ -0,0 +1,17 @@
+from datetime import date
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class HolidayCreate(BaseModel):
+    name: str
+    holiday_date: date
+    work_location: Optional[str] = None
+
+
+class HolidayResponse(HolidayCreate):
+    id: int
+
+    class Config:
+        from_attributes = True
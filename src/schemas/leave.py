@@ -1,6 +1,6 @@
 from datetime import date, datetime
 from enum import Enum
-from typing import Optional
+from typing import List, Optional
 
 from dateutil import parser
 from pydantic import BaseModel, Field, field_validator
@@ -49,6 +49,10 @@ class EmployeeLeaveUpdate(BaseModel):
     reason: Optional[str] = None
 
 
+class EmployeeLeaveBulkUpdate(BaseModel):
+    decisions: List[EmployeeLeaveUpdate] = Field(min_length=1, max_length=500)
+
+
 class EmployeeLeaveResponse(BaseModel):
     id: int
     employee_id: int